@@ -1,12 +1,23 @@
 from __future__ import annotations
-from typing import Tuple, Callable
-import random
+from typing import Optional, Tuple, Callable, Sequence
+import heapq
+import itertools
+import threading
 import time
 import socket
+import numpy as np
+from .mmsg import sendv
+
+# Random draws are generated this many at a time and consumed one per packet
+RNG_BATCH = 4096
 
 class UDPEngineEmulator:
     """Software emulator for loss/delay/jitter.
-    GameNetAPI expects: emulator.send_emulated(sock, addr, data)
+    GameNetAPI expects: emulator.send_emulated(sock, addr, bufs)
+
+    Delayed packets are held in a heap ordered by due time and sent by a
+    background thread, so one long delay never blocks the caller or the
+    packets queued behind it.
     """
 
     def __init__(self, loss: float = 0.0, delay_ms: int = 0, jitter_ms: int = 0):
@@ -20,22 +31,111 @@ class UDPEngineEmulator:
         self.delay_ms = int(delay_ms)
         self.jitter_ms = int(jitter_ms)
 
+        self._rng = np.random.default_rng()
+        self._loss_buf = self._rng.random(RNG_BATCH).tolist()
+        self._loss_idx = 0
+        self._jitter_buf = self._rng.uniform(-self.jitter_ms, self.jitter_ms, RNG_BATCH).tolist()
+        self._jitter_idx = 0
+
+        self._pq = []  # (due_s, tie, sock, addr, bufs)
+        self._tie = itertools.count()  # avoids comparing sockets/buffers on equal due times
+        self._cv = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        if self.delay_ms > 0 or self.jitter_ms > 0:
+            self._thread = threading.Thread(target=self._drain, name="EmulatorDrain", daemon=True)
+            self._thread.start()
+
+        # Specialize the per-packet path for the configured impairments so a
+        # disabled one costs neither a branch nor an RNG draw. Parameters are
+        # therefore fixed at construction.
+        if self.loss <= 0 and self._thread is None:
+            self.send_emulated = self._send_passthrough
+        elif self._thread is None:
+            self.send_emulated = self._send_loss_only
+        elif self.loss <= 0:
+            self.send_emulated = self._send_delay_only
+
     def get_delay_ms(self) -> float:
         """Return current delay including jitter."""
         delay_ms = float(self.delay_ms)
         if self.jitter_ms > 0:
-            delay_ms += random.uniform(-self.jitter_ms, self.jitter_ms)
+            i = self._jitter_idx
+            if i >= RNG_BATCH:
+                self._jitter_buf = self._rng.uniform(-self.jitter_ms, self.jitter_ms, RNG_BATCH).tolist()
+                i = 0
+            self._jitter_idx = i + 1
+            delay_ms += self._jitter_buf[i]
         return max(0.0, delay_ms)
 
     def drop_packet(self) -> bool:
         """Decide whether to drop the packet based on loss rate."""
-        return random.random() < self.loss
+        i = self._loss_idx
+        if i >= RNG_BATCH:
+            self._loss_buf = self._rng.random(RNG_BATCH).tolist()
+            i = 0
+        self._loss_idx = i + 1
+        return self._loss_buf[i] < self.loss
+
+    def send_emulated(self, sock: socket.socket, addr: Optional[Tuple[str, int]], bufs: Sequence[bytes]) -> None:
+        """Apply loss/delay/jitter, then send via the provided socket.
 
-    def send_emulated(self, sock: socket.socket, addr: Tuple[str, int], data: bytes) -> None:
-        """Apply loss/delay/jitter, then send via the provided socket."""
+        bufs are the pieces of one datagram (e.g. header, payload); they are
+        gathered by the kernel rather than concatenated here. addr=None sends
+        to the socket's connected peer.
+        """
         if self.drop_packet():
             return
         d = self.get_delay_ms()
-        if d > 0:
-            time.sleep(d / 1000.0)
-        sock.sendto(data, addr)
\ No newline at end of file
+        if d <= 0:
+            sendv(sock, addr, bufs)
+            return
+        with self._cv:
+            heapq.heappush(self._pq, (time.monotonic() + d / 1000.0, next(self._tie), sock, addr, bufs))
+            self._cv.notify()
+
+    def _send_passthrough(self, sock: socket.socket, addr: Optional[Tuple[str, int]], bufs: Sequence[bytes]) -> None:
+        sendv(sock, addr, bufs)
+
+    def _send_loss_only(self, sock: socket.socket, addr: Optional[Tuple[str, int]], bufs: Sequence[bytes]) -> None:
+        if not self.drop_packet():
+            sendv(sock, addr, bufs)
+
+    def _send_delay_only(self, sock: socket.socket, addr: Optional[Tuple[str, int]], bufs: Sequence[bytes]) -> None:
+        d = self.get_delay_ms()
+        if d <= 0:
+            sendv(sock, addr, bufs)
+            return
+        with self._cv:
+            heapq.heappush(self._pq, (time.monotonic() + d / 1000.0, next(self._tie), sock, addr, bufs))
+            self._cv.notify()
+
+    def stop(self) -> None:
+        """Stop the drain thread; packets still in flight are discarded."""
+        if self._thread is None:
+            return
+        with self._cv:
+            self._stopped = True
+            self._cv.notify()
+        self._thread.join(timeout=1.0)
+
+    def _drain(self) -> None:
+        """Sleep until the earliest packet is due, then send it."""
+        while True:
+            with self._cv:
+                while not self._stopped:
+                    if not self._pq:
+                        self._cv.wait()
+                        continue
+                    wait_s = self._pq[0][0] - time.monotonic()
+                    if wait_s <= 0:
+                        break
+                    self._cv.wait(wait_s)
+                if self._stopped:
+                    return
+                _due, _tie, sock, addr, bufs = heapq.heappop(self._pq)
+            try:
+                sendv(sock, addr, bufs)
+            except OSError:
+                # Socket closed while the packet was "in the network"
+                pass
@@ -1,13 +1,37 @@
 from __future__ import annotations
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, List
+import array
+import itertools
+import os
+import queue
 import socket
+import sys
 import threading
 import time
 from collections import deque
-from .packet import (RELIABLE, UNRELIABLE, ACK, HEADER_SIZE, ACK_SIZE,
-                     pack_header, unpack_header, pack_ack, unpack_ack, now_ms)
+from .packet import (RELIABLE, UNRELIABLE, ACK, HEADER_SIZE, ACK_SIZE, HDR_STRUCT, ACK_STRUCT,
+                     parse_header, pack_ack, now_ms)
 from .emulator import UDPEngineEmulator
-from .reliable import SRSender, SRReceiver
+from .reliable import SRSender, SRReceiver, monotonic_ms
+from .mmsg import BatchSender, BatchReceiver, TX_BATCH
+
+# Requested SO_SNDBUF/SO_RCVBUF size; 0 keeps the OS default
+DEFAULT_SOCK_BUF = 4 * 1024 * 1024
+
+
+def _noop(*args) -> None:
+    """Metrics hook that does nothing; positional-only, so no kwargs dict per call."""
+
+
+class DummyMetrics:
+    """Metrics sink with the MetricsRecorder hooks that does nothing."""
+    on_sent = staticmethod(_noop)
+    on_sent_many = staticmethod(_noop)
+    on_recv = staticmethod(_noop)
+    on_ack = staticmethod(_noop)
+
+
+DUMMY_METRICS = DummyMetrics()
 
 
 class GameNetAPI:
@@ -27,37 +51,50 @@ class GameNetAPI:
         # Default skip threshold to reflect ~1.5RTT links
         skip_threshold_ms: int = 300,
         on_drop: Optional[Callable[[int], None]] = None,
-        metrics=None):
+        metrics=None,
+        reuse_port: bool = False,
+        bind_core: Optional[int] = None,
+        sndbuf: int = DEFAULT_SOCK_BUF,
+        rcvbuf: int = DEFAULT_SOCK_BUF,
+        gso: bool = False):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_port and hasattr(socket, "SO_REUSEPORT"):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.sock.bind(bind_addr)
+        self._set_sock_bufs(sndbuf, rcvbuf)
+        # CPU to pin the recv thread to (ideally the one servicing the NIC IRQ)
+        self.bind_core = bind_core
         self.peer_addr = None
         
-        self._send_seq_reliable = 0
-        self._send_seq_unreliable = 0
-
-        self._unacked_packets = {}  # {seq: (data, send_time, retries)}
-        self._recv_buffer = {}  # For out-of-order reliable packets {seq: (header, payload)}
-        self._next_expected_seq = 0
+        # Reliable seqs, retransmission and reordering all live in SRSender/SRReceiver
+        self._next_unreliable_seq = itertools.count().__next__
+        self._pack_hdr = HDR_STRUCT.pack  # (channel, seq, ts_ms) -> header bytes
+        self._pack_ack = ACK_STRUCT.pack  # (ACK, seq, rwnd) -> ack bytes
+        self._unpack_ack = ACK_STRUCT.unpack_from
 
-        self.recv_queue = deque()
+        self.recv_queue = queue.SimpleQueue()
         self.running = False
         self._recv_thread = threading.Thread(target=self._recv_loop, daemon=True)
+        self._rx_batcher = BatchReceiver(self.sock)
+
+        # Outbound datagrams are queued and flushed in batches by the TX thread
+        self._tx_queue = deque()  # (addr, bufs)
+        self._tx_event = threading.Event()
+        self._tx_stop = threading.Event()
+        # gso: coalesce equal-size runs with UDP_SEGMENT (Linux, bulk reliable flows)
+        self._tx_batcher = BatchSender(self.sock, TX_BATCH, gso=gso)
+        self._tx_thread = threading.Thread(target=self._tx_loop, daemon=True)
 
         self.emulator = None
+        self._rebind_send()
         self.SKIP_THRESHOLD_MS = skip_threshold_ms
         self.on_drop = on_drop
-        self.metrics = metrics
-
-        # Initialize metrics with a dummy if none provided
-        if self.metrics is None:
-        # Create a dummy metrics object that has the required methods but does nothing
-            class DummyMetrics:
-                def on_sent(self, *args, **kwargs): pass
-                def on_recv(self, *args, **kwargs): pass
-                def on_ack(self, *args, **kwargs): pass
-            self.metrics = DummyMetrics()
-
-        self._rx_ts = {}  # seq -> header.timestamp_ms for reliable delivery
+        # Fall back to the shared no-op recorder so hot paths never need a guard
+        self.metrics = metrics if metrics is not None else DUMMY_METRICS
+        self._on_sent = self.metrics.on_sent
+        self._on_sent_many = getattr(self.metrics, 'on_sent_many', None) or self._on_sent_each
+        self._on_ack = self.metrics.on_ack
+
         self.sr_sender = SRSender(
             window_size=32,
             rto_ms=200,
@@ -65,20 +102,66 @@ class GameNetAPI:
             on_send_raw=self._sr_on_send_raw,  # wrap + send reliable
             on_drop=self._sr_on_drop,
             on_rtt=self._sr_on_rtt,
-            clock_ms=lambda: int(time.time() * 1000),
+            clock_ms=monotonic_ms,
+            on_send_raw_batch=self._sr_on_send_raw_batch,
         )
         self.sr_receiver = SRReceiver(
             deliver_in_order=self._sr_deliver_in_order,
+            deliver_batch=self._sr_deliver_batch,
             send_ack=self._sr_send_ack,        # emit ACKs
+            send_ack_batch=self._sr_send_ack_batch,
             skip_threshold_ms=skip_threshold_ms,
-            clock_ms=lambda: int(time.time() * 1000),
+            clock_ms=monotonic_ms,
             window_size=32,
         )
 
+        # seq -> header.timestamp_ms for reliable delivery. Only seqs inside the
+        # receive window are live at once, so a power-of-two ring comfortably
+        # larger than the window never collides; 0 marks an empty slot.
+        ring = 1
+        while ring < 4 * self.sr_receiver.window_size:
+            ring <<= 1
+        self._rx_ts_mask = ring - 1
+        self._rx_ts_ring = array.array('q', [0]) * ring
+
+    def _set_sock_bufs(self, sndbuf: int, rcvbuf: int):
+        """Enlarge kernel socket buffers so bursts are not dropped on overrun.
+
+        The kernel may cap the request (Linux: net.core.wmem_max/rmem_max); a
+        capped buffer is logged.
+        """
+        for name, opt, size in (("SNDBUF", socket.SO_SNDBUF, sndbuf), ("RCVBUF", socket.SO_RCVBUF, rcvbuf)):
+            if not size:
+                continue
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, opt, size)
+            except OSError as e:
+                print(f"[API] Could not set socket buffer to {size} bytes: {e}")
+                continue
+            granted = self.sock.getsockopt(socket.SOL_SOCKET, opt)
+            # Linux reports double the usable size (it includes bookkeeping)
+            if sys.platform.startswith("linux"):
+                granted //= 2
+            if granted < size:
+                print(f"[API] {name} capped by the kernel: requested {size}, got {granted} bytes")
+
     def start(self):
         self.running = True
+        self._tx_thread.start()
         self.sr_sender.start()               # start SR timers
         self._recv_thread.start()
+        if self.bind_core is not None:
+            self._pin_recv_thread(self.bind_core)
+
+    def _pin_recv_thread(self, core: int):
+        """Pin the recv thread to one CPU (Linux only; no-op elsewhere)."""
+        if not hasattr(os, "sched_setaffinity"):
+            print("[API] CPU pinning not supported on this platform, ignoring bind_core.")
+            return
+        try:
+            os.sched_setaffinity(self._recv_thread.native_id, {core})
+        except OSError as e:
+            print(f"[API] Could not pin recv thread to core {core}: {e}")
 
     def stop(self):
         self.running = False
@@ -88,15 +171,66 @@ class GameNetAPI:
         time.sleep(0.1)
         # close socket and join thread
         self.sr_sender.stop()
+        # flush whatever is still queued before the socket goes away
+        self._tx_stop.set()
+        self._tx_event.set()
+        if self._tx_thread.is_alive():
+            self._tx_thread.join(timeout=1.0)
         try: self.sock.close()
         except Exception: pass
         self._recv_thread.join(timeout=1.0)
 
-    def set_peer(self, addr):
+    def set_peer(self, addr, connect: bool = True):
+        """Send to addr from now on.
+
+        connect=True connect()s the socket: the kernel keeps the route cached,
+        so sends to the peer can omit the destination (see BatchSender.peer),
+        but datagrams from any other source are then discarded. A peer learned
+        from incoming traffic uses connect=False so other senders still get in.
+        """
+        if connect:
+            self.sock.connect(addr)
+            self._tx_batcher.peer = addr
         self.peer_addr = addr
+        self._rebind_send()
 
     def attach_emulator(self, emulator: UDPEngineEmulator):
         self.emulator = emulator
+        self._rebind_send()
+
+    def _rebind_send(self):
+        """Bind the per-packet send/flush paths to closures over the current
+        peer and emulator, so the hot path skips the attribute lookups.
+        Must be re-run whenever peer_addr or emulator changes."""
+        append = self._tx_queue.append
+        extend = self._tx_queue.extend
+        wake = self._tx_event.set
+        addr = self.peer_addr
+        connected = self._tx_batcher.peer
+
+        def send_impl(bufs):
+            append((addr, bufs))
+            wake()
+
+        def send_many_impl(bufs_list):
+            extend([(addr, bufs) for bufs in bufs_list])
+            wake()
+
+        if self.emulator:
+            sock = self.sock
+            send_emulated = self.emulator.send_emulated
+
+            # If the socket is connect()ed, BSD/macOS reject an explicit
+            # destination on it (EISCONN), so pass None like BatchSender
+            def flush_impl(batch):
+                for a, bufs in batch:
+                    send_emulated(sock, None if a == connected else a, bufs)
+        else:
+            flush_impl = self._tx_batcher.send_batch
+
+        self._send_impl = send_impl
+        self._send_many_impl = send_many_impl
+        self._flush_impl = flush_impl
 
     def send(self, payload: bytes, reliable: bool):
         if not self.peer_addr:
@@ -111,48 +245,138 @@ class GameNetAPI:
             
             # Calculate actual bytes including header
             total_bytes = HEADER_SIZE + len(payload)
-            if self.metrics:  # ADD THIS CHECK
-                self.metrics.on_sent(RELIABLE, seq, total_bytes)
+            self._on_sent(RELIABLE, seq, total_bytes)
             return seq
         else:
             # UNRELIABLE uses its own sequence numbers
-            seq_num = self._send_seq_unreliable
-            self._send_seq_unreliable += 1
-            header = pack_header(UNRELIABLE, seq_num)
+            # Header seq is a uint16, so wrap like the reliable channel does
+            seq_num = self._next_unreliable_seq() & 0xFFFF
+            header = self._pack_hdr(UNRELIABLE, seq_num, now_ms())
             total_bytes = len(header) + len(payload)
-            if self.metrics:  # ADD THIS CHECK
-                self.metrics.on_sent(UNRELIABLE, seq_num, total_bytes)
-            self._send_internal(header + payload)
+            self._on_sent(UNRELIABLE, seq_num, total_bytes)
+            self._send_internal(header, payload)
             return seq_num
 
-        
+    def send_many(self, payloads: List[bytes], reliable_flags: List[bool]) -> List[Optional[int]]:
+        """send() for several payloads at once; returns one seq (or None) per payload.
+
+        Unreliable datagrams are queued together with a single TX wakeup, so
+        a burst reaches the kernel as one sendmmsg batch.
+        """
+        if not self.peer_addr:
+            raise ConnectionError("No peer address, Call set_peer() first.")
+
+        sr_send = self.sr_sender.send
+        next_seq = self._next_unreliable_seq
+        pack_hdr = self._pack_hdr
+        ts = now_ms()
+        seqs = []
+        out = []
+        rows = []
+        for payload, reliable in zip(payloads, reliable_flags):
+            if reliable:
+                seq = sr_send(payload)
+                if seq is not None:
+                    rows.append((RELIABLE, seq, HEADER_SIZE + len(payload)))
+            else:
+                seq = next_seq() & 0xFFFF
+                hdr = pack_hdr(UNRELIABLE, seq, ts)
+                rows.append((UNRELIABLE, seq, len(hdr) + len(payload)))
+                out.append((hdr, payload))
+            seqs.append(seq)
+        self._on_sent_many(rows)
+        if out:
+            self._send_many_impl(out)
+        return seqs
+
+
     def recv(self, block=True, timeout=None):
-        start_time = time.time()
-        while True:
-            if self.recv_queue:
-                return self.recv_queue.popleft()
+        try:
             if not block:
-                return None
-            if timeout is not None and (time.time() - start_time) > timeout:
-                return None
-            if not self.running:
-                return None
-            time.sleep(0.001)
+                return self.recv_queue.get_nowait()
+            # Block in slices (also for a finite timeout) so callers notice stop()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.running:
+                wait_s = 0.1
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait_s = min(wait_s, remaining)
+                try:
+                    return self.recv_queue.get(timeout=wait_s)
+                except queue.Empty:
+                    pass
+            return self.recv_queue.get_nowait()
+        except queue.Empty:
+            return None
 
+    def recv_batch(self, max_items: int = 64, timeout=None) -> list:
+        """Wait like recv(block=True, timeout) for one message, then also take
+        whatever else is already queued, up to max_items. Returns a list of
+        (channel, seq, ts, payload); empty on timeout or stop()."""
+        first = self.recv(block=True, timeout=timeout)
+        if first is None:
+            return []
+        items = [first]
+        get_nowait = self.recv_queue.get_nowait
+        try:
+            while len(items) < max_items:
+                items.append(get_nowait())
+        except queue.Empty:
+            pass
+        return items
 
-    def _send_internal(self, data: bytes):
-        if self.emulator:
-            self.emulator.send_emulated(self.sock, self.peer_addr, data)
-        else:
-            self.sock.sendto(data, self.peer_addr)
+
+    def _send_internal(self, *bufs: bytes):
+        """Queue a datagram, given as its pieces (header, payload), for the TX thread."""
+        self._send_impl(bufs)
+
+    def _tx_loop(self):
+        """Drain the TX queue, sending up to TX_BATCH datagrams per syscall.
+
+        Never waits for a batch to fill: whatever is queued gets sent.
+        """
+        popleft = self._tx_queue.popleft
+        while not self._tx_stop.is_set() or self._tx_queue:
+            self._tx_event.clear()
+            if not self._tx_queue:
+                self._tx_event.wait(0.1)
+                continue
+
+            batch = []
+            try:
+                while len(batch) < TX_BATCH:
+                    batch.append(popleft())
+            except IndexError:
+                pass
+
+            try:
+                self._flush_impl(batch)
+            except ConnectionRefusedError:
+                # ICMP port-unreachable from an earlier send (peer not up yet);
+                # the datagrams are lost just as they would be unconnected
+                pass
+            except (socket.error, OSError):
+                if self.running:
+                    print("Socket error in tx_loop, dropping batch.")
     
     def _recv_loop(self):
+        rx = self._rx_batcher
         while self.running:
             try:
-                data, addr = self.sock.recvfrom(2048)
-                if not self.peer_addr:
-                    self.peer_addr = addr
-                self._internal_process_packet(data)
+                # One syscall drains up to RX_BATCH datagrams into recycled buffers
+                batch = rx.recv_batch()
+                if batch and not self.peer_addr:
+                    # Learned peer: stay unconnected so other senders are still received
+                    self.set_peer(rx.addr_of(0), connect=False)
+                for data in batch:
+                    self._internal_process_packet(data)
+                # ACKs for the whole burst go out together
+                self.sr_receiver.flush_acks()
+            except ConnectionRefusedError:
+                # Connected socket reporting an ICMP error for an earlier send
+                continue
             except (socket.error, OSError):
                 if self.running:
                     # Only print error if we weren't expecting to stop
@@ -160,31 +384,35 @@ class GameNetAPI:
                     pass
                 break
 
-    def _internal_process_packet(self, data: bytes):
+    def _internal_process_packet(self, data):
         """Processes a raw packet as if it were just received from the socket."""
+        n = len(data)
         # Check for ACK packet first (most common check)
-        if len(data) == ACK_SIZE and data[0] == ACK:
+        if n == ACK_SIZE and data[0] == ACK:
             self._handle_ack(data)
-        elif len(data) >= HEADER_SIZE:
-            header = unpack_header(data[:HEADER_SIZE])
-            payload = data[HEADER_SIZE:]
+        elif n >= HEADER_SIZE:
+            channel, seq_num, ts = parse_header(data)
+            # Zero-copy slice (data may also be a view into a recycled RX buffer);
+            # the payload is only copied out once something decides to keep it
+            payload = memoryview(data)[HEADER_SIZE:]
 
-            if header.channel_type == UNRELIABLE:
-                self.recv_queue.append((UNRELIABLE, header.seq_num, header.timestamp_ms, payload))
-            elif header.channel_type == RELIABLE:
+            if channel == UNRELIABLE:
+                self.recv_queue.put_nowait((UNRELIABLE, seq_num, ts, bytes(payload)))
+            elif channel == RELIABLE:
                 # Store timestamp for later delivery
-                self._rx_ts[header.seq_num] = header.timestamp_ms
-                # Hand off to the SRReceiver for buffering and ACK management
-                self.sr_receiver.on_data(header.seq_num, payload)
+                self._rx_ts_ring[seq_num & self._rx_ts_mask] = ts
+                # Hand off to the SRReceiver for buffering and ACK management;
+                # it copies the payload only if it delivers or buffers it
+                self.sr_receiver.on_data(seq_num, payload)
 
     def _handle_ack(self, data: bytes):
         """Handles an incoming ACK packet."""
-        ack_seq, recv_window = unpack_ack(data) 
+        _, ack_seq, recv_window = self._unpack_ack(data)
         was_new_ack = self.sr_sender.ack(ack_seq, recv_window)
         
         try:
-            if self.metrics and was_new_ack:  # Only record new ACKs, not duplicates
-                self.metrics.on_ack(RELIABLE, ack_seq, ACK_SIZE)
+            if was_new_ack:  # Only record new ACKs, not duplicates
+                self._on_ack(RELIABLE, ack_seq, ACK_SIZE)
         except Exception:
             # Metrics updates must not crash packet processing
             pass
@@ -193,23 +421,59 @@ class GameNetAPI:
         """Wrap reliable payload with your header and send."""
         if not self.peer_addr:
             return
-        hdr = pack_header(RELIABLE, seq)
+        hdr = self._pack_hdr(RELIABLE, seq, now_ms())
         total_bytes = len(hdr) + len(payload)
-        if self.metrics:  # ADD THIS CHECK
-            self.metrics.on_sent(RELIABLE, seq, total_bytes)
-        self._send_internal(hdr + payload)
+        self._on_sent(RELIABLE, seq, total_bytes)
+        self._send_internal(hdr, payload)
+
+    def _sr_on_send_raw_batch(self, items: List[Tuple[int, bytes]]) -> None:
+        """Wrap a burst of retransmissions and queue them with a single TX wakeup."""
+        if not self.peer_addr:
+            return
+        pack_hdr = self._pack_hdr
+        ts = now_ms()
+        out = [(pack_hdr(RELIABLE, seq, ts), payload) for seq, payload in items]
+        self._on_sent_many([(RELIABLE, seq, HEADER_SIZE + len(payload)) for seq, payload in items])
+        self._send_many_impl(out)
+
+    def _on_sent_each(self, rows) -> None:
+        """on_sent_many for metrics sinks that only implement on_sent."""
+        for channel, seq, num_bytes in rows:
+            self._on_sent(channel, seq, num_bytes)
 
     def _sr_send_ack(self, ack_seq: int, recv_window: int) -> None:
         """Emit per-packet ACK (unchanged wire format)."""
         if not self.peer_addr:
             return
-        ack_packet = pack_ack(ack_seq, recv_window) 
-        self._send_internal(ack_packet)
+        self._send_internal(self._pack_ack(ACK, ack_seq, recv_window))
+
+    def _sr_send_ack_batch(self, acks: List[Tuple[int, int]]) -> None:
+        """Emit a burst of per-packet ACKs with a single TX wakeup."""
+        if not self.peer_addr:
+            return
+        pack_ack = self._pack_ack
+        self._send_many_impl([(pack_ack(ACK, seq, rwnd),) for seq, rwnd in acks])
 
     def _sr_deliver_in_order(self, seq: int, payload: bytes) -> None:
         """Deliver in-order to app; include the original header timestamp if we saw it."""
-        ts = self._rx_ts.pop(seq, now_ms())
-        self.recv_queue.append((RELIABLE, seq, ts, payload))
+        slot = seq & self._rx_ts_mask
+        ts = self._rx_ts_ring[slot] or now_ms()
+        self._rx_ts_ring[slot] = 0
+        self.recv_queue.put_nowait((RELIABLE, seq, ts, payload))
+
+    def _sr_deliver_batch(self, items: List[Tuple[int, bytes]]) -> None:
+        """Deliver a run of in-order packets drained from the reorder buffer."""
+        ring = self._rx_ts_ring
+        mask = self._rx_ts_mask
+        put = self.recv_queue.put_nowait
+        fallback_ts = 0
+        for seq, payload in items:
+            slot = seq & mask
+            ts = ring[slot]
+            if not ts:
+                ts = fallback_ts = fallback_ts or now_ms()
+            ring[slot] = 0
+            put((RELIABLE, seq, ts, payload))
 
     def _sr_on_drop(self, seq: int) -> None:
         print(f"[RELIABLE] drop seq={seq} after max retries")
@@ -3,124 +3,400 @@ from dataclasses import dataclass, field
 import os
 from typing import List, Dict, Optional
 import csv
+import threading
 import time
-from collections import defaultdict
+from array import array
+from itertools import islice
+import numpy as np
 from .packet import now_ms, RELIABLE, UNRELIABLE
 
 RFC3550_CLOCK_HZ = 8000
 
+# Column order of each per-packet record / CSV row
+RECORD_FIELDS = ('timestamp_s', 'channel', 'sequence', 'bytes', 'latency_ms')
+CSV_CHUNK_ROWS = 1000
+CSV_BUFFER_BYTES = 1 << 20
+# Column types for reading exported CSVs back (see read_metrics_csv)
+CSV_DTYPES = {'timestamp_s': 'float64', 'channel': 'int8', 'sequence': 'int64',
+              'bytes': 'int32', 'latency_ms': 'float64'}
+
+# Jitter is kept as a Q16 fixed-point integer (ms << JITTER_Q)
+JITTER_Q = 16
+
+# Channel ids are small ints (RELIABLE=0, UNRELIABLE=1, ACK=2); one spare slot
+N_CHANNELS = 4
+
+# Clocks bound at module level so the per-packet hooks skip the time.* lookup.
+# Record timestamps are monotonic (immune to NTP steps); only one-way latency
+# needs the wall clock, since the peer stamps headers with now_ms()
+_time_ns = time.time_ns
+_monotonic_ns = time.monotonic_ns
+
+
+class _ChanStat:
+    """Per-channel state that is not in the record log.
+
+    Jitter is a sequential EWMA (Q16 ms); recv_count/total_bytes_recv count ACKs
+    (on_ack keeps no records). The remaining counters are only used when
+    records are disabled; otherwise those totals are reduced from the log.
+    """
+    __slots__ = ('recv_count', 'total_bytes_recv', 'last_arrival_time_ms',
+                 'last_transit_time', 'jitter', 'sent_count', 'total_bytes_sent',
+                 'data_recv_count', 'data_bytes_recv', 'total_latency_ms', 'total_latency_sq')
+
+    def __init__(self):
+        self.recv_count = 0
+        self.total_bytes_recv = 0
+        self.last_arrival_time_ms = 0
+        self.last_transit_time = 0
+        self.jitter = 0
+        self.sent_count = 0
+        self.total_bytes_sent = 0
+        self.data_recv_count = 0
+        self.data_bytes_recv = 0
+        self.total_latency_ms = 0
+        self.total_latency_sq = 0
+
+
+class _Shard:
+    """One producer thread's counters and record columns; only that thread writes it."""
+    __slots__ = ('stats', 'tx_ts', 'tx_ch', 'tx_seq', 'tx_bytes',
+                 'rx_ts', 'rx_ch', 'rx_seq', 'rx_bytes', 'rx_lat', 'tx_appenders', 'rx_appenders')
+
+    def __init__(self):
+        self.stats = [_ChanStat() for _ in range(N_CHANNELS)]
+        # Sent and received records as parallel typed arrays; sent records have
+        # no latency column (it is exported as 0.0)
+        self.tx_ts = array('d')
+        self.tx_ch = array('B')
+        self.tx_seq = array('H')
+        self.tx_bytes = array('I')
+        self.rx_ts = array('d')
+        self.rx_ch = array('B')
+        self.rx_seq = array('H')
+        self.rx_bytes = array('I')
+        self.rx_lat = array('d')
+        self.tx_appenders = (self.tx_ts.append, self.tx_ch.append, self.tx_seq.append,
+                             self.tx_bytes.append)
+        self.rx_appenders = (self.rx_ts.append, self.rx_ch.append, self.rx_seq.append,
+                             self.rx_bytes.append, self.rx_lat.append)
+
+
+def _total(shards: List[_Shard], ch: int, name: str):
+    return sum(getattr(sh.stats[ch], name) for sh in shards)
+
+
+def _column(shards: List[_Shard], name: str) -> np.ndarray:
+    return np.concatenate([np.frombuffer(getattr(sh, name), dtype=getattr(sh, name).typecode)
+                           for sh in shards])
+
+
 @dataclass
 class MetricsRecorder:
-    def __init__(self, role: str = "unknown"):
+    def __init__(self, role: str = "unknown", record_events: bool = True):
+        """
+        Args:
+            role: "sender" or "receiver" (affects how the summary counts)
+            record_events: keep a per-packet record for export(). When
+                False only running totals are kept, so memory stays constant
+                but latency percentiles are unavailable.
+        """
         self.role = role
-        self.records = []
+        self.record_events = record_events
+        if not record_events:
+            self.on_sent = self._count_sent
+            self.on_sent_many = self._count_sent_many
+            self.on_recv = self._count_recv
         self.start_time = time.monotonic()
-        self.channel_stats = defaultdict(lambda: {
-            'sent_count': 0,
-            'recv_count': 0,
-            'total_bytes_sent': 0,
-            'total_bytes_recv': 0,
-            'total_latency_ms': 0,
-            'last_arrival_time_ms': 0,
-            'last_transit_time': 0,
-            'jitter': 0.0
-        })
+        # Origin of the records' timestamp_s (monotonic, see _monotonic_ns)
+        self._start_ns = _monotonic_ns()
+        # Hooks run on several threads (app send, SR pacer, recv loop). Each
+        # thread gets its own shard, so the hot path never writes shared state
+        # and needs no lock; shards are merged in get_summary()/export_csv().
+        self._tls = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+
+    def _new_shard(self) -> _Shard:
+        shard = _Shard()
+        with self._shards_lock:
+            self._shards.append(shard)
+        self._tls.shard = shard
+        return shard
 
     def on_sent(self, channel, sequence: int, num_bytes: int) -> None:
         """Record a single packet sent on this channel."""
         if num_bytes is None:
             num_bytes = 0
-        stats = self.channel_stats[channel]
-        stats['sent_count'] += 1
-        stats['total_bytes_sent'] += num_bytes
-
-        self.records.append({
-            'timestamp_s': time.monotonic() - self.start_time,
-            'channel': channel,
-            'sequence': sequence,  # Use actual sequence number
-            'bytes': num_bytes,    # Use actual byte count
-            'latency_ms': 0.0,
-        })
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        # Appends are pre-bound on the shard, so this per-packet path does
+        # local loads instead of attribute lookups
+        ts_append, ch_append, seq_append, bytes_append = shard.tx_appenders
+        ts_append((_monotonic_ns() - self._start_ns) * 1e-9)
+        ch_append(channel)
+        seq_append(sequence)
+        bytes_append(num_bytes)
+
+    def on_sent_many(self, rows) -> None:
+        """on_sent for a burst of (channel, sequence, num_bytes) rows.
+
+        The rows share one timestamp and are appended with one extend per
+        column instead of a call and four appends per packet.
+        """
+        if not rows:
+            return
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        channels, sequences, sizes = zip(*rows)
+        shard.tx_ts.extend([(_monotonic_ns() - self._start_ns) * 1e-9] * len(rows))
+        shard.tx_ch.extend(channels)
+        shard.tx_seq.extend(sequences)
+        shard.tx_bytes.extend([b or 0 for b in sizes])
 
     def on_recv(self, channel: int, sequence: int, num_bytes: int, header_ts_ms: int) -> None:
         """
         Record a single packet received on this channel.
         """
-        arrival_time_ms = now_ms()
+        arrival_time_ms = (_time_ns() // 1_000_000) & 0xFFFFFFFF  # == now_ms()
         one_way_latency = arrival_time_ms - header_ts_ms
 
-        stats = self.channel_stats[channel]
-        stats['recv_count'] += 1
-        stats['total_bytes_recv'] += num_bytes
-        stats['total_latency_ms'] += one_way_latency
-
-        transit_time = one_way_latency
-        if stats['last_transit_time'] > 0:
-            d = abs(transit_time - stats['last_transit_time'])
-            stats['jitter'] += (d - stats['jitter']) / 16.0
-        stats['last_transit_time'] = transit_time
-
-        self.records.append({
-            'timestamp_s': time.monotonic() - self.start_time,
-            'channel': channel,
-            'sequence': sequence,  # Use actual sequence number
-            'bytes': num_bytes,    # Use actual byte count
-            'latency_ms': one_way_latency
-        })
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        stats = shard.stats[channel]
+        # Integer jitter EWMA J += (|D| - J)/16 (RFC 3550 A.8) in Q16 fixed point;
+        # the first sample is masked out rather than branched around
+        last_transit = stats.last_transit_time
+        j = stats.jitter
+        stats.jitter = j + ((((abs(one_way_latency - last_transit) << JITTER_Q) - j + 8) >> 4)
+                            & -(last_transit > 0))
+        stats.last_transit_time = one_way_latency
+
+        # Counts, bytes and latency statistics are all reduced from these
+        # columns in get_summary()
+        ts_append, ch_append, seq_append, bytes_append, lat_append = shard.rx_appenders
+        ts_append((_monotonic_ns() - self._start_ns) * 1e-9)
+        ch_append(channel)
+        seq_append(sequence)
+        bytes_append(num_bytes)
+        lat_append(one_way_latency)
+
+    def _count_sent(self, channel, sequence: int, num_bytes: int) -> None:
+        """on_sent when records are disabled: update totals only."""
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        stats = shard.stats[channel]
+        stats.sent_count += 1
+        stats.total_bytes_sent += num_bytes or 0
+
+    def _count_sent_many(self, rows) -> None:
+        """on_sent_many when records are disabled."""
+        for channel, sequence, num_bytes in rows:
+            self._count_sent(channel, sequence, num_bytes)
+
+    def _count_recv(self, channel: int, sequence: int, num_bytes: int, header_ts_ms: int) -> None:
+        """on_recv when records are disabled: update totals and jitter only."""
+        one_way_latency = ((_time_ns() // 1_000_000) & 0xFFFFFFFF) - header_ts_ms
+
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        stats = shard.stats[channel]
+        # Integer jitter EWMA J += (|D| - J)/16 (RFC 3550 A.8) in Q16 fixed point;
+        # the first sample is masked out rather than branched around
+        last_transit = stats.last_transit_time
+        j = stats.jitter
+        stats.jitter = j + ((((abs(one_way_latency - last_transit) << JITTER_Q) - j + 8) >> 4)
+                            & -(last_transit > 0))
+        stats.last_transit_time = one_way_latency
+        stats.data_recv_count += 1
+        stats.data_bytes_recv += num_bytes
+        stats.total_latency_ms += one_way_latency
+        stats.total_latency_sq += one_way_latency * one_way_latency
 
     def get_summary(self) -> dict:
         duration_s = time.monotonic() - self.start_time
+        with self._shards_lock:
+            shards = list(self._shards)
+        if not shards:
+            return {}
+
+        # Whole-log reductions: one bincount per quantity over all channels
+        tx_ch = _column(shards, 'tx_ch')
+        rx_ch = _column(shards, 'rx_ch')
+        rx_lat = _column(shards, 'rx_lat')
+        sent_counts = np.bincount(tx_ch, minlength=N_CHANNELS)
+        recv_counts = np.bincount(rx_ch, minlength=N_CHANNELS)
+        recv_bytes = np.bincount(rx_ch, weights=_column(shards, 'rx_bytes'), minlength=N_CHANNELS)
+        latency_sums = np.bincount(rx_ch, weights=rx_lat, minlength=N_CHANNELS)
+        latency_sq_sums = np.bincount(rx_ch, weights=rx_lat * rx_lat, minlength=N_CHANNELS)
+        shard_recv_counts = [np.bincount(np.frombuffer(sh.rx_ch, dtype=np.uint8), minlength=N_CHANNELS)
+                             + [s.data_recv_count for s in sh.stats]
+                             for sh in shards]
+        # Group latencies by channel once so each channel's samples are a slice
+        order = np.argsort(rx_ch, kind='stable')
+        lat_by_ch = np.split(rx_lat[order], np.cumsum(recv_counts)[:-1])
+
         summary = {}
-        for ch, stats in self.channel_stats.items():
+        for ch in range(N_CHANNELS):
+            # Recorded packets (from the log) plus unrecorded ones (running totals)
+            ack_count = _total(shards, ch, 'recv_count')
+            ack_bytes = _total(shards, ch, 'total_bytes_recv')
+            data_count = int(recv_counts[ch]) + _total(shards, ch, 'data_recv_count')
+            data_bytes = float(recv_bytes[ch]) + _total(shards, ch, 'data_bytes_recv')
+            latency_sum = float(latency_sums[ch]) + _total(shards, ch, 'total_latency_ms')
+            latency_sq = float(latency_sq_sums[ch]) + _total(shards, ch, 'total_latency_sq')
+            # Jitter is tracked per thread; weight by packets each thread received
+            jitter = (sum(sh.stats[ch].jitter * int(c[ch]) for sh, c in zip(shards, shard_recv_counts))
+                      / data_count / (1 << JITTER_Q)) if data_count else 0.0
+
             # For sender, count unique sequences to avoid counting retransmissions
             if self.role == "sender" and hasattr(self, '_sent_sequences'):
                 sent_count = len(self._sent_sequences.get(ch, set()))
             else:
-                sent_count = stats['sent_count']
-                
-            recv_count = stats['recv_count']
+                sent_count = int(sent_counts[ch]) + _total(shards, ch, 'sent_count')
+
+            recv_count = data_count + ack_count
+            if sent_count == 0 and recv_count == 0:
+                continue  # channel never used
 
             if self.role == "sender" and ch == 0:  # Reliable channel
                 pdr = round((recv_count / sent_count * 100.0), 2) if sent_count > 0 else 0.0
             else:
                 pdr = "N/A"
 
-            avg_latency = (stats['total_latency_ms'] / recv_count) if recv_count > 0 else 0
-            throughput_kbps = (stats['total_bytes_recv'] * 8 / duration_s / 1000) if duration_s > 0 else 0
+            avg_latency = (latency_sum / recv_count) if recv_count > 0 else 0
+            throughput_kbps = ((data_bytes + ack_bytes) * 8 / duration_s / 1000) if duration_s > 0 else 0
+
+            if data_count > 1:
+                var = (latency_sq - latency_sum * latency_sum / data_count) / (data_count - 1)
+                latency_std = max(var, 0.0) ** 0.5
+            else:
+                latency_std = 0.0
+            # Percentiles need the samples, so they only cover recorded packets
+            lat = lat_by_ch[ch]
+            if lat.size:
+                p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+            else:
+                p50 = p95 = p99 = 0.0
 
             summary[ch] = {
                 'packets_sent': sent_count,
                 'packets_received': recv_count,
                 'packet_delivery_ratio_%': pdr,
                 'avg_latency_ms': round(avg_latency, 2),
-                'jitter_ms': round(stats['jitter'], 2),
+                'latency_std_ms': round(latency_std, 2),
+                'latency_p50_ms': round(float(p50), 2),
+                'latency_p95_ms': round(float(p95), 2),
+                'latency_p99_ms': round(float(p99), 2),
+                'jitter_ms': round(jitter, 2),
                 'throughput_kbps': round(throughput_kbps, 2)
             }
         return summary
 
+    def unique_sent_counts(self) -> Dict[int, int]:
+        """Distinct sequence numbers sent per channel, so retransmissions count once.
+
+        Reduced from the in-memory record log (no export/re-read needed); with
+        record_events=False this falls back to the raw send totals.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        if not shards:
+            return {}
+        if not self.record_events:
+            return {ch: _total(shards, ch, 'sent_count') for ch in range(N_CHANNELS)}
+        # (channel, seq) packed into one int so a single np.unique dedups both
+        keys = np.unique((_column(shards, 'tx_ch').astype(np.int64) << 16)
+                         | _column(shards, 'tx_seq'))
+        counts = np.bincount(keys >> 16, minlength=N_CHANNELS)
+        return {ch: int(c) for ch, c in enumerate(counts)}
+
     def on_ack(self, channel: int, sequence: int, num_bytes: int = 0) -> None:
         """Record that an ACK was received - only count unique ACKs"""
         if channel == RELIABLE:
             # Only count the first ACK for each sequence to avoid counting duplicates
             if not hasattr(self, '_acked_sequences'):
                 self._acked_sequences = set()
-            
+
             if sequence in self._acked_sequences:
                 return  # Skip duplicate ACKs
-                
+
             self._acked_sequences.add(sequence)
-        
-        stats = self.channel_stats[channel]
-        stats['recv_count'] += 1
-        stats['total_bytes_recv'] += num_bytes
+
+        shard = getattr(self._tls, 'shard', None) or self._new_shard()
+        stats = shard.stats[channel]
+        stats.recv_count += 1
+        stats.total_bytes_recv += num_bytes
+
+    def _merged_columns(self) -> tuple:
+        """Sent and received records of all shards as RECORD_FIELDS columns, by timestamp."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        tx_ts = _column(shards, 'tx_ts')
+        cols = (
+            np.concatenate([tx_ts, _column(shards, 'rx_ts')]),
+            np.concatenate([_column(shards, 'tx_ch'), _column(shards, 'rx_ch')]),
+            np.concatenate([_column(shards, 'tx_seq'), _column(shards, 'rx_seq')]),
+            np.concatenate([_column(shards, 'tx_bytes'), _column(shards, 'rx_bytes')]),
+            np.concatenate([np.zeros(len(tx_ts)), _column(shards, 'rx_lat')]),
+        )
+        order = np.argsort(cols[0], kind='stable')
+        return tuple(c[order] for c in cols)
+
+    def export(self, filepath: str):
+        """Write the records as Parquet if filepath ends in .parquet (needs
+        pyarrow), else as CSV."""
+        if filepath.endswith('.parquet'):
+            self.export_parquet(filepath)
+        else:
+            self.export_csv(filepath)
+
+    def export_parquet(self, filepath: str):
+        """Write the record columns straight to a Parquet file, with no per-row conversion."""
+        if not self.record_events:
+            print("Metrics export skipped: recorder was created with record_events=False")
+            return
+        if not any(shard.tx_ts or shard.rx_ts for shard in self._shards):
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from None
+
+        cols = self._merged_columns()
+        table = pa.Table.from_arrays([pa.array(c) for c in cols], names=list(RECORD_FIELDS))
+        pq.write_table(table, filepath)
+        print(f"Metrics data exported to {filepath}")
 
     def export_csv(self, filepath: str):
-        if not self.records:
+        if not self.record_events:
+            print("Metrics export skipped: recorder was created with record_events=False")
+            return
+        if not any(shard.tx_ts or shard.rx_ts for shard in self._shards):
             return
 
-        with open(filepath, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.records[0].keys())
-            writer.writeheader()
-            writer.writerows(self.records)
+        rows = zip(*(c.tolist() for c in self._merged_columns()))
+        with open(filepath, 'w', newline='', buffering=CSV_BUFFER_BYTES) as f:
+            writer = csv.writer(f)
+            writer.writerow(RECORD_FIELDS)
+            while True:
+                chunk = list(islice(rows, CSV_CHUNK_ROWS))
+                if not chunk:
+                    break
+                writer.writerows(chunk)
+
+        print(f"Metrics data exported to {filepath}")
+
+
+def read_metrics_csv(filepath: str):
+    """Load a file written by MetricsRecorder.export into a pandas DataFrame.
 
-        print(f"Metrics data exported to {filepath}")
\ No newline at end of file
+    Only RECORD_FIELDS are parsed, with fixed dtypes instead of inference.
+    Uses pandas' pyarrow engine when pyarrow is installed, else the C engine.
+    .parquet files are read with pd.read_parquet (needs pyarrow).
+    """
+    import pandas as pd
+    if filepath.endswith('.parquet'):
+        return pd.read_parquet(filepath, columns=list(RECORD_FIELDS)).astype(CSV_DTYPES)
+    try:
+        import pyarrow  # noqa: F401
+        engine = 'pyarrow'
+    except ImportError:
+        engine = 'c'
+    return pd.read_csv(filepath, engine=engine, usecols=list(RECORD_FIELDS), dtype=CSV_DTYPES)
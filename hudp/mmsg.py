@@ -0,0 +1,279 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+import ctypes
+import ctypes.util
+import errno
+import select
+import socket
+import struct
+import sys
+
+# Max datagrams handed to the kernel per sendmmsg call
+TX_BATCH = 64
+# Max datagrams pulled from the kernel per recvmmsg call
+RX_BATCH = 32
+RX_BUF_SIZE = 2048
+# Buffers gathered into one datagram (header + payload)
+MAX_IOV = 2
+
+MSG_DONTWAIT = 0x40
+
+# UDP generic segmentation offload (Linux >= 4.18)
+SOL_UDP = 17
+UDP_SEGMENT = 103
+GSO_MAX_SEGMENTS = 64     # kernel UDP_MAX_SEGMENTS
+GSO_MAX_BYTES = 65000     # one GSO send must fit a single IP datagram
+_SOCKADDR_IN_LEN = 16
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.sendmmsg.restype = ctypes.c_int
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                                  ctypes.c_int, ctypes.c_void_p]
+        libc.recvmmsg.restype = ctypes.c_int
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+HAVE_SENDMMSG = _libc is not None
+HAVE_RECVMMSG = _libc is not None
+HAVE_GSO = sys.platform.startswith("linux") and hasattr(socket.socket, "sendmsg")
+
+
+def _sockaddr_in(addr: Tuple[str, int]) -> ctypes.Array:
+    """Build a struct sockaddr_in (16 bytes) for an IPv4 (host, port)."""
+    host, port = addr
+    raw = struct.pack("=H", socket.AF_INET) + struct.pack("!H", port) \
+        + socket.inet_aton(socket.gethostbyname(host)) + bytes(8)
+    return ctypes.create_string_buffer(raw, len(raw))
+
+
+def sendv(sock: socket.socket, addr: Optional[Tuple[str, int]], bufs: Sequence[bytes]) -> None:
+    """Send one datagram gathered from bufs (e.g. header, payload) without concatenating.
+
+    addr=None sends to the socket's connected peer.
+    """
+    if addr is None:
+        if len(bufs) == 1:
+            sock.send(bufs[0])
+        elif hasattr(sock, "sendmsg"):
+            sock.sendmsg(bufs)
+        else:
+            sock.send(b"".join(bufs))
+    elif len(bufs) == 1:
+        sock.sendto(bufs[0], addr)
+    elif hasattr(sock, "sendmsg"):
+        sock.sendmsg(bufs, (), 0, addr)
+    else:
+        sock.sendto(b"".join(bufs), addr)
+
+
+class BatchSender:
+    """Sends a batch of (addr, bufs) datagrams with one sendmmsg syscall.
+
+    Each datagram is gathered from up to MAX_IOV buffers (header, payload),
+    so the wire packet is never concatenated in Python. The mmsghdr/iovec
+    arrays are allocated once and reused for every batch. On non-Linux
+    platforms (or if libc lacks sendmmsg) falls back to a sendv loop.
+
+    With gso=True, runs of consecutive equal-size datagrams to the same peer
+    are instead handed to the kernel as one buffer with a UDP_SEGMENT cmsg,
+    and segmented below the socket layer. GSO switches itself off if the
+    kernel rejects it.
+
+    Datagrams addressed to `peer` (the address the socket is connect()ed
+    to, see GameNetAPI.set_peer) are sent without a destination, so the
+    kernel reuses the connected route instead of looking one up per packet.
+    """
+
+    def __init__(self, sock: socket.socket, batch: int = TX_BATCH, gso: bool = False):
+        self.sock = sock
+        self.batch = int(batch)
+        self.gso = gso and HAVE_GSO
+        self._iov = (_IOVec * (self.batch * MAX_IOV))()
+        self._msgs = (_MMsgHdr * self.batch)()
+        self._addr_cache: Dict[Tuple[str, int], ctypes.Array] = {}
+        self.peer: Optional[Tuple[str, int]] = None
+        for i in range(self.batch):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iov[i * MAX_IOV])
+
+    def _sockaddr(self, addr: Tuple[str, int]) -> ctypes.Array:
+        sa = self._addr_cache.get(addr)
+        if sa is None:
+            sa = self._addr_cache[addr] = _sockaddr_in(addr)
+        return sa
+
+    def send_batch(self, items: List[Tuple[Tuple[str, int], Sequence[bytes]]]) -> None:
+        """Send every datagram in items (at most self.batch of them)."""
+        if self.gso and len(items) > 1:
+            self._send_batch_gso(items)
+        else:
+            self._send_mmsg(items)
+
+    def _send_batch_gso(self, items: List[Tuple[Tuple[str, int], Sequence[bytes]]]) -> None:
+        """Coalesce equal-size runs via GSO; everything else goes through sendmmsg, in order."""
+        pending = []
+        i, n = 0, len(items)
+        while i < n:
+            addr, bufs = items[i]
+            size = sum(map(len, bufs))
+            limit = min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // max(size, 1))
+            j = i + 1
+            while (j < n and j - i < limit and items[j][0] == addr
+                   and sum(map(len, items[j][1])) == size):
+                j += 1
+            if j - i >= 2 and self.gso:
+                if pending:
+                    self._send_mmsg(pending)
+                    pending = []
+                self._send_gso(addr, items[i:j], size)
+            else:
+                pending.extend(items[i:j])
+            i = j
+        if pending:
+            self._send_mmsg(pending)
+
+    def _send_gso(self, addr: Tuple[str, int], run, seg_size: int) -> None:
+        bufs = [b for _, parts in run for b in parts]
+        cmsg = [(SOL_UDP, UDP_SEGMENT, struct.pack("=H", seg_size))]
+        try:
+            if addr == self.peer:
+                self.sock.sendmsg(bufs, cmsg)
+            else:
+                self.sock.sendmsg(bufs, cmsg, 0, addr)
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                raise
+            # No GSO on this kernel/route: disable it and send the run normally
+            print(f"[GSO] UDP_SEGMENT unavailable ({e}), falling back to sendmmsg.")
+            self.gso = False
+            self._send_mmsg(run)
+
+    def _send_mmsg(self, items: List[Tuple[Tuple[str, int], Sequence[bytes]]]) -> None:
+        peer = self.peer
+        if not HAVE_SENDMMSG or len(items) == 1:
+            for addr, bufs in items:
+                sendv(self.sock, None if addr == peer else addr, bufs)
+            return
+
+        n = len(items)
+        iov = self._iov
+        keep = []  # holds converted buffers alive until the syscall returns
+        for i, (addr, bufs) in enumerate(items):
+            hdr = self._msgs[i].msg_hdr
+            if addr == peer:
+                hdr.msg_name = None
+                hdr.msg_namelen = 0
+            else:
+                sa = self._sockaddr(addr)
+                hdr.msg_name = ctypes.addressof(sa)
+                hdr.msg_namelen = len(sa)
+            hdr.msg_iovlen = len(bufs)
+            base = i * MAX_IOV
+            for j, b in enumerate(bufs):
+                if type(b) is not bytes:
+                    b = bytes(b)
+                    keep.append(b)
+                iov[base + j].iov_base = ctypes.cast(ctypes.c_char_p(b), ctypes.c_void_p)
+                iov[base + j].iov_len = len(b)
+
+        fd = self.sock.fileno()
+        sent = 0
+        while sent < n:
+            rc = _libc.sendmmsg(fd, ctypes.byref(self._msgs[sent]), n - sent, 0)
+            if rc <= 0:
+                # Kernel refused the batch; send the remainder one by one so
+                # the error (if persistent) surfaces as a normal socket error.
+                for addr, bufs in items[sent:]:
+                    sendv(self.sock, None if addr == peer else addr, bufs)
+                return
+            sent += rc
+
+
+class BatchReceiver:
+    """Receives up to `batch` datagrams per recvmmsg syscall into recycled buffers.
+
+    recv_batch() returns memoryviews into the preallocated buffers; they are
+    only valid until the next recv_batch() call, so copy anything kept.
+    On non-Linux platforms falls back to one recvfrom_into per call.
+    """
+
+    def __init__(self, sock: socket.socket, batch: int = RX_BATCH, buf_size: int = RX_BUF_SIZE):
+        self.sock = sock
+        self.batch = int(batch) if HAVE_RECVMMSG else 1
+        self._bufs = [bytearray(buf_size) for _ in range(self.batch)]
+        self._views = [memoryview(b) for b in self._bufs]
+        self._addrs: List[Tuple[str, int]] = [("", 0)] * self.batch
+        if not HAVE_RECVMMSG:
+            return
+
+        self._iov = (_IOVec * self.batch)()
+        self._msgs = (_MMsgHdr * self.batch)()
+        self._names = [ctypes.create_string_buffer(_SOCKADDR_IN_LEN) for _ in range(self.batch)]
+        self._cbufs = [(ctypes.c_char * buf_size).from_buffer(b) for b in self._bufs]
+        for i in range(self.batch):
+            self._iov[i].iov_base = ctypes.addressof(self._cbufs[i])
+            self._iov[i].iov_len = buf_size
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(self._iov[i])
+            hdr.msg_iovlen = 1
+            hdr.msg_name = ctypes.addressof(self._names[i])
+        self._poller = select.poll()
+        self._poller.register(sock.fileno(), select.POLLIN)
+
+    def addr_of(self, i: int) -> Tuple[str, int]:
+        """Source address of the i-th datagram from the last recv_batch()."""
+        if not HAVE_RECVMMSG:
+            return self._addrs[i]
+        raw = self._names[i].raw
+        return socket.inet_ntoa(raw[4:8]), struct.unpack("!H", raw[2:4])[0]
+
+    def recv_batch(self, timeout_ms: int = 100) -> List[memoryview]:
+        """Wait up to timeout_ms for data, then drain what the kernel has queued."""
+        if not HAVE_RECVMMSG:
+            n, addr = self.sock.recvfrom_into(self._bufs[0])
+            self._addrs[0] = addr
+            return [self._views[0][:n]]
+
+        if not self._poller.poll(timeout_ms):
+            return []
+        for i in range(self.batch):
+            self._msgs[i].msg_hdr.msg_namelen = _SOCKADDR_IN_LEN
+        n = _libc.recvmmsg(self.sock.fileno(), self._msgs, self.batch, MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            # ECONNREFUSED: an ICMP port-unreachable reported on a connected socket
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR, errno.ECONNREFUSED):
+                return []
+            raise OSError(err, "recvmmsg failed")
+        views = self._views
+        msgs = self._msgs
+        return [views[i][:msgs[i].msg_len] for i in range(n)]
@@ -1,5 +1,4 @@
 from __future__ import annotations
-from dataclasses import dataclass
 from typing import Tuple, NamedTuple
 import time
 import struct
@@ -12,37 +11,44 @@ ACK = 2
 
 HEADER_FORMAT = "!BHI"
 HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HDR_STRUCT = struct.Struct(HEADER_FORMAT)
 
 # ACK Packet
 ACK_FORMAT = "!BHH"
 ACK_SIZE = struct.calcsize(ACK_FORMAT)
-@dataclass
-class PacketHeader:
-    """Protocol header fields.
+ACK_STRUCT = struct.Struct(ACK_FORMAT)
+class PacketHeader(NamedTuple):
+    """Protocol header fields (a tuple, so no per-packet instance dict).
     | ChannelType (1 B) | SeqNo (2 B) | Timestamp (4 B) | => 7 bytes
     """
     channel_type: int
     seq_num: int
     timestamp_ms: int
 
+_time_ns = time.time_ns
+
 def now_ms() -> int:
     """Return current time in milliseconds (uint32 wrap is fine)."""
-    return int(time.time() * 1000) & 0xFFFFFFFF
+    return (_time_ns() // 1_000_000) & 0xFFFFFFFF
 
 def pack_header(channel: int, seq_num: int) -> bytes:
     """Packs header for data packet."""
-    return struct.pack(HEADER_FORMAT, channel, seq_num, now_ms())
+    return HDR_STRUCT.pack(channel, seq_num, now_ms())
+
+# Hot-path header parse: (buf, offset=0) -> (channel, seq_num, timestamp_ms).
+# Bound straight to the C-implemented Struct.unpack_from, so there is no
+# Python frame, no PacketHeader allocation and no slice of the datagram.
+parse_header = HDR_STRUCT.unpack_from
 
 def unpack_header(data: bytes) -> PacketHeader:
     """Unpacks header from received data packet."""
-    channel, seq_num, timestamp = struct.unpack(HEADER_FORMAT, data)
-    return PacketHeader(channel, seq_num, timestamp)
+    return PacketHeader._make(HDR_STRUCT.unpack_from(data))
 
 def pack_ack(seq_num: int, recv_window: int) -> bytes:
     """Packs ACK packet with the receiver's available window size."""
-    return struct.pack(ACK_FORMAT, ACK, seq_num, recv_window)
+    return ACK_STRUCT.pack(ACK, seq_num, recv_window)
 
 def unpack_ack(data: bytes) -> tuple[int, int]:
     """Unpacks ACK packet to get seq num."""
-    _, seq_num, recv_window = struct.unpack(ACK_FORMAT, data)
+    _, seq_num, recv_window = ACK_STRUCT.unpack_from(data)
     return seq_num, recv_window
\ No newline at end of file
@@ -1,15 +1,43 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Callable, Optional, Dict, List, Tuple
+from typing import Callable, Optional, List, Tuple
+from array import array
+import logging
+import queue
 import threading
 import time
 from collections import deque
 
+# Per-packet tracing goes through this logger at DEBUG so it costs one level
+# check when disabled; rare events (timeouts, drops, skips) still print.
+logger = logging.getLogger(__name__)
+_DEBUG = logging.DEBUG
+
+# Resolution of monotonic_ms(); the G term of RFC 6298's RTO formula
+_CLOCK_GRANULARITY_MS = 1.0
+
+# SRSender timer never sleeps less than this between timeout scans
+TIMER_MIN_SLEEP_MS = 10
+
+# TIPC-style congestion avoidance: cwnd grows by one packet per this many
+# new ACKs and is halved (not below MIN_CWND) on loss
+CWND_ACKS_PER_INC = 32
+MIN_CWND = 10
+
 Clock = Callable[[], int]
 
+
+_monotonic_ns = time.monotonic_ns
+
+
+def monotonic_ms() -> int:
+    """Millisecond clock for SR timers (immune to wall-clock/NTP jumps)."""
+    return _monotonic_ns() // 1_000_000
+
 # ===============================
 # Mod-16 (uint16) helpers
 # ===============================
+# For readability outside the per-packet paths; SRSender/SRReceiver hot paths
+# inline the equivalent '& 0xFFFF' expressions to skip the call overhead.
 _U16_MOD = 1 << 16
 _U16_MASK = _U16_MOD - 1
 
@@ -29,19 +57,22 @@ def u16_distance(start: int, end: int) -> int:
 
 def u16_in_window(seq: int, start: int, size: int) -> bool:
     """True iff seq in [start, start+size) modulo 2^16."""
-    return u16_distance(start, seq) < size
+    return ((seq - start) & _U16_MASK) < size
 
 # ===============================
 # Sender (SR + adaptive RTO)
 # ===============================
-@dataclass
 class _TxItem:
-    seq: int
-    payload: bytes
-    first_send_ms: int
-    last_send_ms: int
-    retries: int
-    retransmitted: bool
+    """One in-flight packet. Instances are recycled through SRSender._pool."""
+    __slots__ = ('seq', 'payload', 'first_send_ms', 'last_send_ms', 'retries', 'retransmitted')
+
+    def __init__(self):
+        self.seq: int = 0
+        self.payload: Optional[bytes] = None  # None once ACKed/dropped
+        self.first_send_ms: int = 0
+        self.last_send_ms: int = 0
+        self.retries: int = 0
+        self.retransmitted: bool = False
 
 
 class SRSender:
@@ -53,7 +84,8 @@ class SRSender:
         on_send_raw: Optional[Callable[[int, bytes], None]] = None,
         on_drop: Optional[Callable[[int], None]] = None,
         on_rtt: Optional[Callable[[int, int], None]] = None,
-        clock_ms: Clock = lambda: int(time.time() * 1000),
+        clock_ms: Clock = monotonic_ms,
+        on_send_raw_batch: Optional[Callable[[List[Tuple[int, bytes]]], None]] = None,
     ):
         if window_size <= 0 or window_size > _U16_MOD:
             raise ValueError("SRSender: invalid window_size")
@@ -66,16 +98,31 @@ class SRSender:
         self.on_send_raw = on_send_raw or (lambda _s, _p: None)
         self.on_drop = on_drop or (lambda _s: None)
         self.on_rtt = on_rtt or (lambda _s, _r: None)
+        # Optional: send a burst of timeout retransmissions [(seq, payload), ...] in one call
+        self.on_send_raw_batch = on_send_raw_batch
 
         self._base = 0
         self._next_seq = 0
-        self._out: Dict[int, _TxItem] = {}
+        # In-flight items in a ring indexed by seq & mask (None = free). send()
+        # keeps next_seq - base below window_size and the ring is a power of
+        # two >= window_size, so two live seqs never share a slot.
+        ring = 1
+        while ring < self.window_size:
+            ring <<= 1
+        self._mask = ring - 1
+        self._slots: List[Optional[_TxItem]] = [None] * ring
+        self._inflight = 0
+        # Free list of released _TxItems; only touched under _lock. Items are
+        # never referenced outside the lock, so reuse cannot alias a live one.
+        self._pool: deque = deque(maxlen=self.window_size * 2)
+        # (last_send_ms, seq, item) in send order, so the oldest deadline is at
+        # the head. ACKed/resent items leave stale entries that are skipped.
+        self._pending: deque = deque()
 
         self._srtt: Optional[float] = None
         self._rttvar: Optional[float] = None
         self._rto: float = float(rto_ms)
         self._avg_rtt: Optional[float] = None
-        self._initial_rto = float(rto_ms)
         self._K = 4.0
         self._alpha = 1.0 / 8.0
         self._beta = 1.0 / 4.0
@@ -83,7 +130,11 @@ class SRSender:
         self._max_rto = 4000.0
         self.retransmissions = 0
 
+        # _lock guards the window (slots, base/next_seq, pending, pool) and
+        # backs _cv; _cc_lock guards congestion/RTT state (cwnd, ssthresh,
+        # peer rwnd, RTO estimator). They are never held together.
         self._lock = threading.Lock()
+        self._cc_lock = threading.Lock()
         self._stop_evt = threading.Event()
         self._timer_thread: Optional[threading.Thread] = None
 
@@ -93,18 +144,29 @@ class SRSender:
 
         # --- Flow/Congestion Control ---
         self._peer_rwnd = float(self.window_size)
-        self._INITIAL_CWND = 10.0
-        self._cwnd = self._INITIAL_CWND
-        self._ssthresh = float(self.window_size) 
-
-        self._pacing_queue = deque()
+        self._INITIAL_CWND = 10
+        self._cwnd = self._INITIAL_CWND  # integer packets
+        self._ssthresh = self.window_size
+        self._cong_acks = 0  # new ACKs counted toward the next CA increment
+        # min(window, peer rwnd, cwnd) cached for send(); refreshed by
+        # _recompute_eff_win() wherever cwnd or peer rwnd changes
+        self._eff_win = 0
+        self._recompute_eff_win()
+        # Pacer inter-packet gap (RTT / cwnd) in seconds, precomputed wherever
+        # RTT/RTO or cwnd change so the pacer reads one float without the lock
+        self._pacing_gap_s = 0.0
+        self._recompute_pacing_gap() 
+
+        # Seqs of new packets for the pacer (payloads stay in _slots); a None
+        # entry is the stop() sentinel
+        self._pacing_queue: queue.SimpleQueue = queue.SimpleQueue()
         self._pacing_thread: Optional[threading.Thread] = None
         self._last_win_full_log_ms = 0 # Add this line
 
         self._cv = threading.Condition(self._lock) # Add this line
 
 
-        print(f"[SENDER] Initialized. WinSize={self.window_size}, RTO={self._rto:.1f}ms, CWND={self._cwnd:.1f}")
+        print(f"[SENDER] Initialized. WinSize={self.window_size}, RTO={self._rto:.1f}ms, CWND={self._cwnd}")
 
     def start(self) -> None:
         with self._lock:
@@ -125,6 +187,7 @@ class SRSender:
 
     def stop(self) -> None:
         self._stop_evt.set()
+        self._pacing_queue.put(None)  # wake the pacer if it is blocked on get()
         threads_to_join = []
         with self._lock:
             if self._timer_thread:
@@ -139,56 +202,78 @@ class SRSender:
         print("[SENDER] Stopped.")
 
     def _queue_packet_for_pacing(self, seq: int, payload: bytes, is_retransmission: bool):
-        """Adds a packet to the pacing queue. Retransmissions get priority."""
-        with self._lock:
-            if is_retransmission:
-                self.on_send_raw(seq, payload)
-            else:
-                self._pacing_queue.append((seq, payload))
+        """Adds a packet to the pacing queue. Retransmissions get priority.
+
+        Retransmissions bypass the pacer and go straight out; neither path
+        needs _lock (the queue is thread-safe, on_send_raw only enqueues).
+        """
+        if is_retransmission:
+            self.on_send_raw(seq, payload)
+        else:
+            self._pacing_queue.put(seq)
 
     def _pacing_loop(self) -> None:
         """
         Runs in a dedicated thread, pulling packets from a queue and sending
         them at a rate controlled by the congestion window and RTT.
         """
+        get = self._pacing_queue.get
+        slots = self._slots
+        mask = self._mask
         while not self._stop_evt.is_set():
-            packet_to_send = None
-            with self._lock:
-                if self._pacing_queue:
-                    packet_to_send = self._pacing_queue.popleft()
-
-            if packet_to_send:
-                seq, payload = packet_to_send
-                # Send the packet using the actual socket function
-                self.on_send_raw(seq, payload)
-
-                # Calculate the delay until the next packet can be sent
-                with self._lock:
-                    # Use smoothed RTT if available, otherwise fall back to RTO
-                    rtt_s = (self._srtt / 1000.0) if self._srtt is not None else (self._rto / 1000.0)
-                    # Ensure cwnd is at least 1 to avoid division by zero
-                    cwnd = self._cwnd if self._cwnd >= 1.0 else 1.0
-
-                # The core pacing calculation: distribute the CWND over one RTT
-                inter_packet_gap_s = rtt_s / cwnd
-                
-                # Wait for the calculated gap, but be interruptible by stop()
-                self._stop_evt.wait(inter_packet_gap_s)
-            else:
-                # Queue is empty, wait a very small amount of time to avoid busy-waiting
-                self._stop_evt.wait(0.001)
+            # Block until there is work; no polling while idle
+            seq = get()
+            if seq is None:
+                break
+
+            # Fetch the payload from the ring without the lock. Reading payload
+            # before seq is safe: send() sets seq before payload on a recycled
+            # item and ack()/the timer set payload to None before pooling it, so
+            # a mismatch or None means the packet already left the window (resent
+            # by the timer and ACKed, or dropped) and need not go out at all.
+            # (b"" is a valid payload, so it cannot be the marker.)
+            it = slots[seq & mask]
+            if it is None:
+                continue
+            payload = it.payload
+            if it.seq != seq or payload is None:
+                continue
+            self.on_send_raw(seq, payload)
+
+            # Distribute the CWND over one RTT. The gap is a single float kept
+            # current by _recompute_pacing_gap(), so no lock is needed to read it.
+            # Wait for it, but be interruptible by stop()
+            self._stop_evt.wait(self._pacing_gap_s)
+
+    def _halve_cwnd(self) -> None:
+        # Caller holds _cc_lock
+        self._ssthresh = max(MIN_CWND, self._cwnd // 2)
+        self._cwnd = self._ssthresh
+        self._cong_acks = 0
+
+    def _recompute_eff_win(self) -> None:
+        self._eff_win = int(min(self.window_size, self._peer_rwnd, self._cwnd))
+
+    def _recompute_pacing_gap(self) -> None:
+        # Use smoothed RTT if available, otherwise fall back to RTO
+        rtt_ms = self._srtt if self._srtt is not None else self._rto
+        # Ensure cwnd is at least 1 to avoid division by zero
+        cwnd = self._cwnd if self._cwnd >= 1 else 1
+        self._pacing_gap_s = rtt_ms / 1000.0 / cwnd
 
     def _get_effective_window(self) -> int:
-        return int(min(self.window_size, self._peer_rwnd, self._cwnd))
+        return self._eff_win
 
     def send(self, serialized_payload: bytes, timeout_s: float = 1.0) -> Optional[int]:
         now = self.clock_ms()
         with self._lock:
-            effective_win = self._get_effective_window()
-            while len(self._out) >= self._get_effective_window():
+            # Both the in-flight count and the span from base are bounded; the
+            # span keeps every new seq inside the receiver's window (and the ring)
+            while (self._inflight >= self._eff_win
+                   or ((self._next_seq - self._base) & 0xFFFF) >= self.window_size):
                 now = self.clock_ms()  
                 if now - self._last_win_full_log_ms > 500: # Log at most every 500ms
-                    print(f"[SENDER] !! WINDOW FULL !! Cannot send. InFlight={len(self._out)}, EffWin={effective_win} (CWND={self._cwnd:.1f}, PeerRWND={self._peer_rwnd:.1f})")
+                    print(f"[SENDER] !! WINDOW FULL !! Cannot send. InFlight={self._inflight}, EffWin={self._eff_win} (CWND={self._cwnd}, PeerRWND={self._peer_rwnd:.1f})")
                     self._last_win_full_log_ms = now
 
                 if not self._cv.wait(timeout=timeout_s):
@@ -197,13 +282,21 @@ class SRSender:
                     return None
             
             seq = self._next_seq
-            self._next_seq = u16_incr(self._next_seq, 1)
-
-            self._out[seq] = _TxItem(
-                seq=seq, payload=serialized_payload, first_send_ms=now,
-                last_send_ms=now, retries=0, retransmitted=False,
-            )
-            print(f"[SENDER] -> Queued packet {seq}. Base={self._base}, Next={self._next_seq}, InFlight={len(self._out)}")
+            self._next_seq = (seq + 1) & 0xFFFF
+
+            it = self._pool.pop() if self._pool else _TxItem()
+            it.seq = seq
+            it.payload = serialized_payload
+            it.first_send_ms = now
+            it.last_send_ms = now
+            it.retries = 0
+            it.retransmitted = False
+            self._slots[seq & self._mask] = it
+            self._inflight += 1
+            self._pending.append((now, seq, it))
+            if logger.isEnabledFor(_DEBUG):
+                logger.debug("[SENDER] -> Queued packet %d. Base=%d, Next=%d, InFlight=%d",
+                             seq, self._base, self._next_seq, self._inflight)
 
         # MODIFIED: Instead of sending, we now queue it for the pacer
         self._queue_packet_for_pacing(seq, serialized_payload, is_retransmission=False)
@@ -214,69 +307,121 @@ class SRSender:
         # at the end will now be correctly routed to the pacer queue.
         now = self.clock_ms()
         rtt_sample: Optional[int] = None
-        fast_retransmit_item: Optional[_TxItem] = None
+        fast_retransmit: Optional[Tuple[int, bytes]] = None
         was_new_ack = False
         
         with self._lock:
-            if peer_rwnd is not None:
-                self._peer_rwnd = float(peer_rwnd)
-            item_was_in_flight = self._out.pop(ack_seq, None)
+            slots = self._slots
+            mask = self._mask
+            item_was_in_flight = slots[ack_seq & mask]
+            if item_was_in_flight is not None and item_was_in_flight.seq != ack_seq:
+                item_was_in_flight = None  # stale ACK for an older seq in this slot
 
             if item_was_in_flight:
+                slots[ack_seq & mask] = None
+                self._inflight -= 1
                 was_new_ack = True
-                self._cv.notify_all()
-                if item_was_in_flight.retries == 0:
+                self._cv.notify()  # one slot freed -> wake one blocked send()
+                # Karn's algorithm: a retransmitted packet's ACK is ambiguous,
+                # so only never-retransmitted packets produce RTT samples
+                if item_was_in_flight.retries == 0 and not item_was_in_flight.retransmitted:
                     rtt_sample = max(1, now - item_was_in_flight.first_send_ms)
-                
-                if self._cwnd < self._ssthresh:
-                    self._cwnd += 1.0
-                    print(f"[SENDER] <- ACK {ack_seq} (NEW). In Slow Start. CWND -> {self._cwnd:.1f}")
-                else:
-                    self._cwnd += 1.0 / self._cwnd
-                    print(f"[SENDER] <- ACK {ack_seq} (NEW). In Congestion Avoidance. CWND -> {self._cwnd:.1f}")
+                item_was_in_flight.payload = None
+                self._pool.append(item_was_in_flight)
 
                 self._dupacks = 0
-                while self._base != self._next_seq and self._base not in self._out:
-                    self._base = u16_incr(self._base, 1)
+                base = self._base
+                while base != self._next_seq and slots[base & mask] is None:
+                    base = (base + 1) & 0xFFFF
+                self._base = base
             else:
                 was_new_ack = False
                 self._dupacks += 1
-                print(f"[SENDER] <- ACK {ack_seq} (DUPLICATE). Count={self._dupacks}/{self._dupacks_threshold}. Base={self._base}")
-
-                if self._dupacks >= self._dupacks_threshold and self._base in self._out:
-                    print(f"[SENDER] !!! FAST RETRANSMIT of {self._base} !!!")
-                    self._ssthresh = max(10.0, self._cwnd / 2.0)
-                    self._cwnd = self._ssthresh 
-                    print(f"[SENDER]    Congestion event: SSTHRESH={self._ssthresh:.1f}, CWND={self._cwnd:.1f}")
-
-                    fast_retransmit_item = self._out[self._base]
-                    fast_retransmit_item.last_send_ms = now
-                    fast_retransmit_item.retransmitted = True
+                if logger.isEnabledFor(_DEBUG):
+                    logger.debug("[SENDER] <- ACK %d (DUPLICATE). Count=%d/%d. Base=%d",
+                                 ack_seq, self._dupacks, self._dupacks_threshold, self._base)
+
+                if self._dupacks >= self._dupacks_threshold and slots[self._base & mask] is not None:
+                    it = slots[self._base & mask]
+                    it.last_send_ms = now
+                    it.retransmitted = True
+                    fast_retransmit = (it.seq, it.payload)
+                    self._pending.append((now, it.seq, it))
                     self.retransmissions += 1
                     self._dupacks = 0
 
+        if fast_retransmit:
+            print(f"[SENDER] !!! FAST RETRANSMIT of {fast_retransmit[0]} !!!")
+
+        with self._cc_lock:
+            if peer_rwnd is not None:
+                self._peer_rwnd = float(peer_rwnd)
+            if was_new_ack:
+                if self._cwnd < self._ssthresh:
+                    self._cwnd += 1
+                    if logger.isEnabledFor(_DEBUG):
+                        logger.debug("[SENDER] <- ACK %d (NEW). In Slow Start. CWND -> %d", ack_seq, self._cwnd)
+                else:
+                    self._cong_acks += 1
+                    if self._cong_acks >= CWND_ACKS_PER_INC:
+                        self._cong_acks = 0
+                        if self._cwnd < self.window_size:
+                            self._cwnd += 1
+                    if logger.isEnabledFor(_DEBUG):
+                        logger.debug("[SENDER] <- ACK %d (NEW). In Congestion Avoidance. CWND -> %d",
+                                     ack_seq, self._cwnd)
+            elif fast_retransmit:
+                self._halve_cwnd()
+                cwnd_after_loss = self._cwnd
+            # cwnd and/or peer rwnd may have changed above
+            self._recompute_eff_win()
+            if rtt_sample is not None:
+                self._update_rto(rtt_sample)  # also refreshes the pacing gap
+            else:
+                self._recompute_pacing_gap()
+
+        if fast_retransmit:
+            print(f"[SENDER]    Congestion event: SSTHRESH={cwnd_after_loss}, CWND={cwnd_after_loss}")
         if rtt_sample is not None:
-            self._update_rto(rtt_sample)
             self.on_rtt(ack_seq, rtt_sample)
 
-        if fast_retransmit_item:
-            self._queue_packet_for_pacing(
-                fast_retransmit_item.seq, fast_retransmit_item.payload, is_retransmission=True
-            )
+        if fast_retransmit:
+            self._queue_packet_for_pacing(*fast_retransmit, is_retransmission=True)
         return was_new_ack
 
+    def _set_rto_from_estimate(self) -> None:
+        # RFC 6298: RTO = SRTT + max(G, K*RTTVAR), clamped
+        var_term = self._K * self._rttvar
+        if var_term < _CLOCK_GRANULARITY_MS:
+            var_term = _CLOCK_GRANULARITY_MS
+        rto = self._avg_rtt + var_term
+        if rto > self._max_rto:
+            rto = self._max_rto
+        self._rto = rto if rto > self._min_rto else self._min_rto
+        self._recompute_pacing_gap()
+
     def _update_rto(self, rtt_ms: int) -> None:
+        """Fold in one RTT sample. Callers must pass only samples from packets
+        that were never retransmitted (Karn's algorithm); see ack(). Caller
+        holds _cc_lock."""
         rtt = float(rtt_ms)
-        if self._avg_rtt is None:
+        srtt = self._avg_rtt
+        if srtt is None:
+            # RFC 6298 (2.2): first measurement sets SRTT=R, RTTVAR=R/2
             self._avg_rtt = rtt
             self._rttvar = rtt / 2.0
         else:
-            self._rttvar = (1 - self._beta) * self._rttvar + self._beta * abs(self._avg_rtt - rtt)
-            self._avg_rtt = (1 - self._alpha) * self._avg_rtt + self._alpha * rtt
-
-        candidate = max(self._initial_rto, 2.0 * self._avg_rtt)
-        self._rto = max(self._min_rto, min(candidate, self._max_rto))
-         # Keep SR RTT/RTTVAR machinery unchanged if present (no-op if not used)
+            rttvar = self._rttvar
+            diff = srtt - rtt
+            if diff > rttvar:
+                # RTT dropping (Linux tcp_rtt_estimator): weight the deviation
+                # 8x less so a recovering link does not inflate RTTVAR/RTO
+                beta = self._beta * 0.125
+            else:
+                beta = self._beta
+            self._rttvar = rttvar + beta * ((diff if diff >= 0 else -diff) - rttvar)
+            self._avg_rtt = srtt + self._alpha * (rtt - srtt)
+        self._set_rto_from_estimate()
 
     def _backoff_rto(self) -> None:
         rto_before = self._rto
@@ -287,52 +432,83 @@ class SRSender:
             max_allowed_rto = self._max_rto
         
         self._rto = min(self._rto * 1.5, max_allowed_rto) 
+        self._recompute_pacing_gap()
         print(f"[SENDER]    RTO backoff: {rto_before:.1f}ms -> {self._rto:.1f}ms")
 
     def _timer_loop(self) -> None:
         while not self._stop_evt.is_set():
             now = self.clock_ms()
-            to_resend: List[_TxItem] = []
+            to_resend: List[Tuple[int, bytes]] = []
             to_drop: List[int] = []
+            timed_out: List[Tuple[int, int]] = []  # (seq, retries) for logging after the lock
 
             with self._lock:
                 rto_ms = int(self._rto)
-                for seq, it in list(self._out.items()):
-                    if now - it.last_send_ms >= rto_ms:
-                        if it.retries < self.max_retries:
-                            print(f"[SENDER] !!! TIMEOUT on packet {seq} !!! (Retries: {it.retries+1}/{self.max_retries})")
-                            it.retries += 1
-                            it.last_send_ms = now
-                            it.retransmitted = True
-                            to_resend.append(it)
-                            self.retransmissions += 1
-                        else:
-                            print(f"[SENDER] !!! DROPPING packet {seq} !!! (Max retries exceeded)")
-                            to_drop.append(seq)
+                slots = self._slots
+                mask = self._mask
+                pending = self._pending
+                # Only the expired prefix of the send-ordered queue is visited
+                while pending and now - pending[0][0] >= rto_ms:
+                    sent_ms, seq, it = pending.popleft()
+                    if slots[seq & mask] is not it or it.seq != seq or it.last_send_ms != sent_ms:
+                        continue  # ACKed, dropped or resent since this entry
+                    if it.retries < self.max_retries:
+                        it.retries += 1
+                        timed_out.append((seq, it.retries))
+                        it.last_send_ms = now
+                        it.retransmitted = True
+                        to_resend.append((seq, it.payload))
+                        pending.append((now, seq, it))
+                        self.retransmissions += 1
+                    else:
+                        to_drop.append(seq)
 
                 for s in to_drop:
-                    self._out.pop(s, None)
-                    self._cv.notify_all()
-
-                while self._base != self._next_seq and self._base not in self._out:
-                    self._base = u16_incr(self._base, 1)
-
-                if to_resend:
+                    it = slots[s & mask]
+                    slots[s & mask] = None
+                    self._inflight -= 1
+                    it.payload = None
+                    self._pool.append(it)
+                if to_drop:
+                    self._cv.notify(len(to_drop))
+
+                base = self._base
+                while base != self._next_seq and slots[base & mask] is None:
+                    base = (base + 1) & 0xFFFF
+                self._base = base
+                head_ms = pending[0][0] if pending else None
+
+            for seq, retries in timed_out:
+                print(f"[SENDER] !!! TIMEOUT on packet {seq} !!! (Retries: {retries}/{self.max_retries})")
+            for seq in to_drop:
+                print(f"[SENDER] !!! DROPPING packet {seq} !!! (Max retries exceeded)")
+
+            if to_resend:
+                with self._cc_lock:
                     # Apply the less punishing congestion response
-                    self._ssthresh = max(10.0, self._cwnd / 2.0)
-                    self._cwnd = max(self._ssthresh, 4.0) 
-                    print(f"[SENDER]    Congestion event (Timeout): CWND reduced to {self._cwnd:.1f}")
+                    self._halve_cwnd()
+                    self._recompute_eff_win()
+                    cwnd_after_loss = self._cwnd
                     self._backoff_rto()
+                print(f"[SENDER]    Congestion event (Timeout): CWND reduced to {cwnd_after_loss}")
+
+            # Sleep until the oldest pending entry can next expire (an empty
+            # queue means anything sent now is due in one RTO at the earliest)
+            rto_ms = int(self._rto)
+            wait_ms = (head_ms + rto_ms - now) if head_ms is not None else rto_ms
             
-            for it in to_resend:
-                # MODIFIED: Queue the retransmission with high priority
-                self._queue_packet_for_pacing(it.seq, it.payload, is_retransmission=True)
+            if to_resend and self.on_send_raw_batch is not None:
+                self.on_send_raw_batch(to_resend)
+            else:
+                for seq, payload in to_resend:
+                    # MODIFIED: Queue the retransmission with high priority
+                    self._queue_packet_for_pacing(seq, payload, is_retransmission=True)
             for s in to_drop:
                 self.on_drop(s)
 
-            # The timer loop can tick less frequently now
-            sleep_ms = max(10, int(self._rto // 4))
-            self._stop_evt.wait(sleep_ms / 1000.0)
+            # Floor bounds wakeups at high send rates, where stale (ACKed)
+            # entries reach the head roughly once per packet
+            self._stop_evt.wait(max(TIMER_MIN_SLEEP_MS, wait_ms) / 1000.0)
 
 
 
@@ -340,15 +516,20 @@ class SRSender:
 # ===============================
 # Receiver (SR buffering + skip timer)
 # ===============================
+# With send_ack_batch, ACKs are flushed once this many are pending (or on flush_acks())
+ACK_COALESCE = 8
+
 class SRReceiver:
     def __init__(
         self,
         deliver_in_order: Callable[[int, bytes], None],
         send_ack: Callable[[int, int], None],
         skip_threshold_ms: int = 200,
-        clock_ms: Clock = lambda: int(time.time() * 1000),
+        clock_ms: Clock = monotonic_ms,
         window_size: int = 64,
         max_buffer: Optional[int] = None,
+        send_ack_batch: Optional[Callable[[List[Tuple[int, int]]], None]] = None,
+        deliver_batch: Optional[Callable[[List[Tuple[int, bytes]]], None]] = None,
     ):
         if window_size <= 0 or window_size > _U16_MOD:
             raise ValueError("SRReceiver: invalid window_size")
@@ -356,7 +537,12 @@ class SRReceiver:
             raise ValueError("SRReceiver: skip_threshold_ms must be >= 0")
 
         self.deliver_in_order = deliver_in_order
+        # Optional: receive a drained run [(seq, payload), ...] in one call
+        self.deliver_batch = deliver_batch
         self.send_ack = send_ack
+        # Optional: emit [(seq, rwnd), ...] in one call; ACKs are then coalesced
+        self.send_ack_batch = send_ack_batch
+        self._ack_buf: List[Tuple[int, int]] = []
         self.clock_ms = clock_ms
         self.window_size = int(window_size)
         self.skip_threshold_ms = int(skip_threshold_ms)
@@ -364,7 +550,17 @@ class SRReceiver:
 
         self._lock = threading.Lock()
         self._expected = 0
-        self._buffer: Dict[int, Tuple[bytes, int]] = {}
+        # Out-of-order packets, slot = seq & mask. Only seqs inside the receive
+        # window are buffered, so a power-of-two ring >= window_size never has
+        # two live seqs in one slot; the stored seq guards against stale ones.
+        ring = 1
+        while ring < self.window_size:
+            ring <<= 1
+        self._buf_mask = ring - 1
+        # Parallel slot arrays: seq (-1 = empty) and payload; no per-packet tuple
+        self._buf_seq = array('i', [-1]) * ring
+        self._buf_payload: List[Optional[bytes]] = [None] * ring
+        self._buffered = 0
         self._hole_since_ms: Optional[int] = None
 
         self._stop_evt = threading.Event()
@@ -385,47 +581,61 @@ class SRReceiver:
             self._timer_thread.join(timeout=1.0)
         print("[RECEIVER] Stopped.")
 
-    def on_data(self, seq: int, payload: bytes) -> None:
+    def on_data(self, seq: int, payload) -> None:
+        """Handle a reliable data packet.
+
+        payload may be a memoryview into a reused receive buffer; it is copied
+        to bytes only when delivered or buffered, never for stale/dup packets.
+        """
         deliver_list: List[Tuple[int, bytes]] = []
         now = self.clock_ms()
         should_ack = False
         processed_successfully = False
+        ack_flush: Optional[List[Tuple[int, int]]] = None
 
         with self._lock:
-            if u16_in_window(seq, u16(self._expected - self.window_size), self.window_size * 2):
+            # u16 window tests inlined with literal masks (hot path):
+            # dist < win  <=> u16_in_window(seq, expected, win)
+            # ack test    <=> u16_in_window(seq, expected - win, 2 * win)
+            win = self.window_size
+            dist = (seq - self._expected) & 0xFFFF
+            if (dist + win) & 0xFFFF < 2 * win:
                 should_ack = True
 
-            if u16_in_window(seq, self._expected, self.window_size):
-                if seq == self._expected:
+            if dist < win:
+                if dist == 0:
                     # --- Case A: IN-ORDER PACKET ---
-                    print(f"[RECEIVER] <- Data {seq} (IN-ORDER). Delivering to app.")
-                    deliver_list.append((seq, payload))
+                    if logger.isEnabledFor(_DEBUG):
+                        logger.debug("[RECEIVER] <- Data %d (IN-ORDER). Delivering to app.", seq)
+                    deliver_list.append((seq, bytes(payload)))
                     processed_successfully = True
-                    self._expected = u16_incr(self._expected)
+                    self._expected = (seq + 1) & 0xFFFF
                     self._hole_since_ms = None
                     
                     # Drain buffer
-                    drained = []
-                    while self._expected in self._buffer:
-                        p, _ts = self._buffer.pop(self._expected)
-                        deliver_list.append((self._expected, p))
-                        drained.append(self._expected)
-                        self._expected = u16_incr(self._expected)
-                    if drained:
-                         print(f"[RECEIVER]    Drained [{', '.join(map(str, drained))}] from buffer. New Expected={self._expected}")
+                    drained = self._drain_buffer(deliver_list)
+                    if drained and logger.isEnabledFor(_DEBUG):
+                        logger.debug("[RECEIVER]    Drained [%s] from buffer. New Expected=%d",
+                                     ', '.join(map(str, drained)), self._expected)
 
-                elif u16_distance(self._expected, seq) > 0:
+                else:
                     # --- Case B: OUT-OF-ORDER (FUTURE) PACKET ---
-                    if seq not in self._buffer:
-                        if len(self._buffer) < self.max_buffer:
-                            print(f"[RECEIVER] <- Data {seq} (OUT-OF-ORDER). Buffering. Expected={self._expected}, BufSize={len(self._buffer)+1}")
-                            self._buffer[seq] = (payload, now)
+                    slot = seq & self._buf_mask
+                    if self._buf_seq[slot] != seq:
+                        if self._buffered < self.max_buffer:
+                            if logger.isEnabledFor(_DEBUG):
+                                logger.debug("[RECEIVER] <- Data %d (OUT-OF-ORDER). Buffering. Expected=%d, BufSize=%d",
+                                             seq, self._expected, self._buffered + 1)
+                            self._buf_seq[slot] = seq
+                            self._buf_payload[slot] = bytes(payload)
+                            self._buffered += 1
                             processed_successfully = True
                         else:
-                            print(f"[RECEIVER] !! BUFFER FULL !! Dropping packet {seq}. BufSize={len(self._buffer)}")
+                            print(f"[RECEIVER] !! BUFFER FULL !! Dropping packet {seq}. BufSize={self._buffered}")
                             # processed_successfully remains False
                     else:
-                        print(f"[RECEIVER] <- Data {seq} (DUPLICATE of buffered). Ignoring.")
+                        if logger.isEnabledFor(_DEBUG):
+                            logger.debug("[RECEIVER] <- Data %d (DUPLICATE of buffered). Ignoring.", seq)
                         processed_successfully = True
 
                     if self._hole_since_ms is None:
@@ -433,91 +643,96 @@ class SRReceiver:
             
             elif seq < self._expected:
                 # --- Case C: OLD PACKET ---
-                print(f"[RECEIVER] <- Data {seq} (OLD/Stale). Discarding data. Expected={self._expected}")
+                if logger.isEnabledFor(_DEBUG):
+                    logger.debug("[RECEIVER] <- Data %d (OLD/Stale). Discarding data. Expected=%d",
+                                 seq, self._expected)
                 processed_successfully = True
 
             # Send ACK if we handled the packet
             if should_ack and processed_successfully:
-                available_window = self.max_buffer - len(self._buffer)
-                print(f"[RECEIVER] -> Queued ACK {seq}. (Available buffer: {available_window})")
-                self.send_ack(seq, available_window)
+                available_window = self.max_buffer - self._buffered
+                if logger.isEnabledFor(_DEBUG):
+                    logger.debug("[RECEIVER] -> Queued ACK %d. (Available buffer: %d)", seq, available_window)
+                if self.send_ack_batch is None:
+                    self.send_ack(seq, available_window)
+                else:
+                    self._ack_buf.append((seq, available_window))
+                    if len(self._ack_buf) >= ACK_COALESCE:
+                        ack_flush, self._ack_buf = self._ack_buf, []
+
+        if ack_flush:
+            self.send_ack_batch(ack_flush)
 
         # --- Deliver Data outside the lock ---
-        for s, p in deliver_list:
+        if deliver_list:
+            self._deliver(deliver_list, "")
+
+    def _deliver(self, items: List[Tuple[int, bytes]], context: str) -> None:
+        """Hand in-order packets to the app; a run of several crosses the
+        callback boundary once when deliver_batch is set."""
+        if self.deliver_batch is not None and len(items) > 1:
+            try:
+                self.deliver_batch(items)
+            except Exception as e:
+                print(f"[RECEIVER] !! Error delivering packets {items[0][0]}..{items[-1][0]}{context}: {e}")
+            return
+        for s, p in items:
             try:
                 self.deliver_in_order(s, p)
             except Exception as e:
-                print(f"[RECEIVER] !! Error delivering packet {s}: {e}")
+                print(f"[RECEIVER] !! Error delivering packet {s}{context}: {e}")
+
+    def _drain_buffer(self, out: List[Tuple[int, bytes]]) -> List[int]:
+        """Move buffered packets that are now in order into out. Caller holds _lock."""
+        drained = []
+        buf_seq = self._buf_seq
+        buf_payload = self._buf_payload
+        mask = self._buf_mask
+        expected = self._expected
+        slot = expected & mask
+        while buf_seq[slot] == expected:
+            out.append((expected, buf_payload[slot]))
+            buf_seq[slot] = -1
+            buf_payload[slot] = None
+            drained.append(expected)
+            expected = (expected + 1) & 0xFFFF
+            slot = expected & mask
+        self._buffered -= len(drained)
+        self._expected = expected
+        return drained
+
+    def flush_acks(self) -> None:
+        """Send any coalesced ACKs now (call after each receive burst)."""
+        if not self._ack_buf:
+            return
+        with self._lock:
+            acks, self._ack_buf = self._ack_buf, []
+        if acks:
+            self.send_ack_batch(acks)
 
     def _timer_loop(self) -> None:
         tick_ms = max(10, self.skip_threshold_ms // 4)
         while not self._stop_evt.is_set():
+            # Backstop so a coalesced ACK never waits longer than one tick
+            self.flush_acks()
             do_deliver: List[Tuple[int, bytes]] = []
             now = self.clock_ms()
 
             with self._lock:
                 if self._hole_since_ms is not None and (now - self._hole_since_ms >= self.skip_threshold_ms):
                     print(f"[RECEIVER] !!! SKIP MECHANISM: Waited too long for {self._expected}. Skipping it.")
-                    self._expected = u16_incr(self._expected)
+                    self._expected = (self._expected + 1) & 0xFFFF
                     self._hole_since_ms = None 
 
-                    drained = []
-                    while self._expected in self._buffer:
-                        p, _ts = self._buffer.pop(self._expected)
-                        do_deliver.append((self._expected, p))
-                        drained.append(self._expected)
-                        self._expected = u16_incr(self._expected)
-                    
+                    drained = self._drain_buffer(do_deliver)
+
                     if drained:
                         print(f"[RECEIVER]    Delivering [{', '.join(map(str, drained))}] from buffer after skip. New Expected={self._expected}")
 
-                    if self._buffer and self._expected not in self._buffer:
+                    if self._buffered and self._buf_seq[self._expected & self._buf_mask] != self._expected:
                         self._hole_since_ms = now
 
-            for s, p in do_deliver:
-                try:
-                    self.deliver_in_order(s, p)
-                except Exception as e:
-                    print(f"[RECEIVER] !! Error delivering packet {s} after skip: {e}")
+            if do_deliver:
+                self._deliver(do_deliver, " after skip")
 
             self._stop_evt.wait(tick_ms / 1000.0)
-
-    def _pacing_loop(self) -> None:
-        """
-        Runs in a dedicated thread, pulling packets from a queue and sending
-        them at a rate controlled by the congestion window and RTT.
-        Now also respects the remote advertised window: if peer_rwnd <= 0
-        the pacer will pause and requeue the packet.
-        """
-        while not self._stop_evt.is_set():
-            packet_to_send = None
-            with self._lock:
-                if self._pacing_queue:
-                    packet_to_send = self._pacing_queue.popleft()
-
-            if packet_to_send:
-                seq, payload = packet_to_send
-
-                # Respect peer advertised window; if it's zero, requeue and wait a bit.
-                with self._lock:
-                    effective_win = self._get_effective_window()
-                    if effective_win < 1:
-                        # Put it back at front to preserve priority and wait to be notified
-                        self._pacing_queue.appendleft((seq, payload))
-                        # Wait until either stop requested or a short timeout; ack() will notify on window changes
-                        # Use a short wait so shutdown remains responsive
-                        self._stop_evt.wait(0.05)
-                        continue
-
-                # Send the packet using the actual socket function
-                self.on_send_raw(seq, payload)
-
-                # Calculate the delay until the next packet can be sent
-                with self._lock:
-                    rtt_s = (self._srtt / 1000.0) if self._srtt is not None else (self._rto / 1000.0)
-                    cwnd = self._cwnd if self._cwnd >= 1.0 else 1.0
-
-                inter_packet_gap_s = rtt_s / cwnd
-                self._stop_evt.wait(inter_packet_gap_s)
-            else:
-                self._stop_evt.wait(0.001)
\ No newline at end of file
@@ -1,23 +1,43 @@
+import functools
 import os
 import re
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # figures are only saved to PNG; no GUI backend needed
 import matplotlib.pyplot as plt
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from hudp.metrics import read_metrics_csv
 
 SENDER_NAME = "sender"
 RECEIVER_NAME = "receiver"
+SUMMARY_COLUMNS = [
+    "variable",
+    "sender_reliable_latency",
+    "receiver_reliable_latency",
+    "sender_unreliable_latency",
+    "receiver_unreliable_latency",
+    "throughput",
+    "reliability",
+    "window",
+    "inverse_window",
+]
 
 
 # --------------------------------------------
 # Helper functions
 # --------------------------------------------
 
+@functools.lru_cache(maxsize=None)
+def _variable_pattern(experiment_name):
+    return re.compile(rf"{re.escape(experiment_name)}_([\d\.]+)")
+
 def extract_variable_value(folder_name, experiment_name):
     """
     Extracts the numeric experiment variable (e.g., 0.1 from 'loss_0.1').
     """
-    match = re.search(rf"{experiment_name}_([\d\.]+)", folder_name)
+    match = _variable_pattern(experiment_name).search(folder_name)
     value = float(match.group(1)) if match else None
     if value and value > 1: 
         return int(value)
@@ -35,7 +55,7 @@ def load_metrics(base_dir, role, experiment_name, value):
         print(f"[WARN] Missing {role} metrics for {experiment_name}={value}")
         return None
     try:
-        df = pd.read_csv(metrics_file)
+        df = read_metrics_csv(metrics_file)
         return df
     except Exception as e:
         print(f"[ERROR] Failed to load {metrics_file}: {e}")
@@ -44,10 +64,13 @@ def load_metrics(base_dir, role, experiment_name, value):
 def compute_summary(sender_df:pd.DataFrame, receiver_df:pd.DataFrame):
     results = {}
     results["reliability"] = compute_reliability(sender_df, receiver_df)
-    results["sender_reliable_latency"] = compute_latency(sender_df[sender_df["channel"] == 0])
-    results["receiver_reliable_latency"] = compute_latency(receiver_df[receiver_df["channel"] == 0])
-    results["sender_unreliable_latency"] = compute_latency(sender_df[sender_df["channel"] == 1])
-    results["receiver_unreliable_latency"] = compute_latency(receiver_df[receiver_df["channel"] == 1])
+    # One groupby pass per side instead of a boolean mask per channel
+    sender_latency = sender_df.groupby("channel", sort=False)["latency_ms"].mean()
+    receiver_latency = receiver_df.groupby("channel", sort=False)["latency_ms"].mean()
+    results["sender_reliable_latency"] = sender_latency.get(0, np.nan)
+    results["receiver_reliable_latency"] = receiver_latency.get(0, np.nan)
+    results["sender_unreliable_latency"] = sender_latency.get(1, np.nan)
+    results["receiver_unreliable_latency"] = receiver_latency.get(1, np.nan)
     results["throughput"] = compute_throughput(receiver_df)
     window = compute_reliable_window(sender_df, receiver_df)
     results["window"] = window 
@@ -60,25 +83,22 @@ def compute_reliability(sender_df:pd.DataFrame, receiver_df:pd.DataFrame, window
     sender_df = sender_df[sender_df["channel"] == 0]
     receiver_df = receiver_df[receiver_df["channel"] == 0]
 
-    sent_sequences = set(sender_df["sequence"].unique())
-    received_sequences = set(receiver_df["sequence"].unique())
-    received_sequences = received_sequences.intersection(sent_sequences) 
+    sent_sequences = np.unique(sender_df["sequence"].to_numpy())
+    received_sequences = np.unique(receiver_df["sequence"].to_numpy())
 
-    n_sent = len(sent_sequences)
-    n_received = len(received_sequences)
+    n_sent = sent_sequences.size
+    n_received = np.intersect1d(sent_sequences, received_sequences, assume_unique=True).size
 
     if n_sent == 0:
         return 1.0
     return n_received / n_sent
 
-def compute_latency(df:pd.DataFrame):
-    return df["latency_ms"].mean()
-
 def compute_throughput(receiver_df:pd.DataFrame):
     reliable = receiver_df[receiver_df["channel"] == 0]
     unreliable = receiver_df[receiver_df["channel"] == 1]
-    first_received = reliable.sort_values("timestamp_s").drop_duplicates(subset="sequence", keep="first")
-    reliable_bytes = first_received["bytes"].sum()
+    # export_csv writes rows in timestamp order, so the first row of each
+    # sequence is its first arrival; no sort needed to dedupe
+    reliable_bytes = reliable.groupby("sequence", sort=False)["bytes"].first().sum()
     unreliable_bytes = unreliable["bytes"].sum()
     total_bytes = reliable_bytes + unreliable_bytes
     duration = reliable["timestamp_s"].max()
@@ -87,69 +107,152 @@ def compute_throughput(receiver_df:pd.DataFrame):
     return total_bytes / duration
 
 def compute_reliable_window(sender_df: pd.DataFrame, receiver_df: pd.DataFrame):
-    low = 0.0
-    high = sender_df["timestamp_s"].max()   # upper bound = total experiment time
-    eps = 0.01  # binary search tolerance (seconds)
-    
-    if compute_reliability(sender_df, receiver_df, high) >= 1.0:
-        return high
-    
-    while high - low > eps:
-        mid = (low + high) / 2
-        rel = compute_reliability(sender_df, receiver_df, mid)
-        if rel < 1.0:
-            high = mid
-        else:
-            low = mid
+    """
+    Largest send-time window w in which every reliable packet sent before w
+    was received: the first send time of the earliest lost sequence, or the
+    whole experiment if nothing was lost.
+    """
+    sent = sender_df[sender_df["channel"] == 0]
+    received = receiver_df.loc[receiver_df["channel"] == 0, "sequence"].unique()
+    first_sent = sent.groupby("sequence")["timestamp_s"].min()
+    lost = ~np.isin(first_sent.index.to_numpy(), received)
+    if not lost.any():
+        return sender_df["timestamp_s"].max()
+    return round(float(first_sent.to_numpy()[lost].min()), 3)
+
+def summary_cache_path(base_dir, experiment_name):
+    return os.path.join(base_dir, f"{experiment_name}_summary.csv")
+
+def summary_sources_path(base_dir, experiment_name):
+    """Sidecar listing the run directories the cached summary was built from."""
+    return os.path.join(base_dir, f"{experiment_name}_summary.sources")
+
+def save_summary_cache(df_summary, base_dir, experiment_name, subdirs):
+    df_summary.to_csv(summary_cache_path(base_dir, experiment_name), index=False)
+    with open(summary_sources_path(base_dir, experiment_name), "w") as f:
+        f.write("\n".join(subdirs))
+
+def load_cached_summary(base_dir, experiment_name, subdirs):
+    """
+    Return the cached summary table if it was built from exactly these run
+    directories and is newer than every metrics CSV in them, else None.
+    """
+    cache_file = summary_cache_path(base_dir, experiment_name)
+    sources_file = summary_sources_path(base_dir, experiment_name)
+    if not (os.path.exists(cache_file) and os.path.exists(sources_file)):
+        return None
+    # A run deleted or renamed since the cache was written leaves nothing newer
+    with open(sources_file) as f:
+        if f.read().split("\n") != list(subdirs):
+            return None
+    cache_mtime = os.path.getmtime(cache_file)
+    for folder in subdirs:
+        folder_path = os.path.join(base_dir, folder)
+        for name in os.listdir(folder_path):
+            if name.endswith(".csv") and os.path.getmtime(os.path.join(folder_path, name)) > cache_mtime:
+                return None
+    try:
+        return pd.read_csv(cache_file)
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable summary cache {cache_file}: {e}")
+        return None
 
-    return round(low, 3)
+def new_summary_figure():
+    """Create the 4x1 figure plot_experiment draws into; reusable across experiments."""
+    return plt.subplots(4, 1, figsize=(12, 10))
 
-def plot_experiment(experiment_name, df_summary, base_dir):
+def plot_experiment(experiment_name, df_summary, base_dir, fig=None, axes=None):
+    """
+    Render the summary plots and save them as <experiment>_summary.png.
+    Pass (fig, axes) from new_summary_figure() to reuse one figure for
+    several experiments (the caller then closes it); otherwise a figure is
+    created and closed here.
+    """
+    owns_fig = fig is None
+    if owns_fig:
+        fig, axes = new_summary_figure()
+    else:
+        for ax in axes:
+            ax.clear()
+        # Undo the previous title and top margin so tight_layout starts fresh
+        fig.suptitle("")
+        fig.subplots_adjust(top=plt.rcParams["figure.subplot.top"])
     x = df_summary["variable"]
-    plt.figure(figsize=(12, 10))
 
     # Sender Latency
-    plt.subplot(4, 1, 1)
-    plt.plot(x, df_summary["sender_reliable_latency"], "o-", color="tab:blue", label="Sender Reliable Latency (s)")
-    plt.plot(x, df_summary["receiver_reliable_latency"], "s--", color="tab:green", label="Receiver Reliable Latency (s)")
-    plt.plot(x, df_summary["sender_unreliable_latency"], "o-", color="tab:orange", label="Sender Unreliable Latency (s)")
-    plt.plot(x, df_summary["receiver_unreliable_latency"], "s--", color="tab:red", label="Receiver Unreliable Latency (s)")
-    plt.ylabel("Latency (s)")
-    plt.grid(True)
-    plt.legend()
+    ax = axes[0]
+    ax.plot(x, df_summary["sender_reliable_latency"], "o-", color="tab:blue", label="Sender Reliable Latency (s)")
+    ax.plot(x, df_summary["receiver_reliable_latency"], "s--", color="tab:green", label="Receiver Reliable Latency (s)")
+    ax.plot(x, df_summary["sender_unreliable_latency"], "o-", color="tab:orange", label="Sender Unreliable Latency (s)")
+    ax.plot(x, df_summary["receiver_unreliable_latency"], "s--", color="tab:red", label="Receiver Unreliable Latency (s)")
+    ax.set_ylabel("Latency (s)")
+    ax.grid(True)
+    ax.legend()
     
     # Throughput
-    plt.subplot(4, 1, 2)
-    plt.plot(x, df_summary["throughput"], "o-", color="tab:orange", label="Throughput (B/s)")
-    plt.ylabel("Throughput (B/s)")
-    plt.grid(True)
-    plt.legend()
+    ax = axes[1]
+    ax.plot(x, df_summary["throughput"], "o-", color="tab:orange", label="Throughput (B/s)")
+    ax.set_ylabel("Throughput (B/s)")
+    ax.grid(True)
+    ax.legend()
 
     # Reliable Window
-    plt.subplot(4, 1, 3)
-    plt.plot(x, df_summary["inverse_window"], "s--", color="tab:purple", label="Length of tail unreliability(s)")
-    plt.xlabel(experiment_name.capitalize())
-    plt.ylabel("Length of tail unreliability(s)")
-    plt.grid(True)
-    plt.legend()
+    ax = axes[2]
+    ax.plot(x, df_summary["inverse_window"], "s--", color="tab:purple", label="Length of tail unreliability(s)")
+    ax.set_xlabel(experiment_name.capitalize())
+    ax.set_ylabel("Length of tail unreliability(s)")
+    ax.grid(True)
+    ax.legend()
 
     # Reliability
-    plt.subplot(4, 1, 4)
-    plt.plot(x, df_summary["reliability"], "o-", color="tab:red", label="Reliability")
-    plt.xlabel(experiment_name.capitalize())
-    plt.ylabel("Reliability")
-    plt.grid(True)
-    plt.legend()
+    ax = axes[3]
+    ax.plot(x, df_summary["reliability"], "o-", color="tab:red", label="Reliability")
+    ax.set_xlabel(experiment_name.capitalize())
+    ax.set_ylabel("Reliability")
+    ax.grid(True)
+    ax.legend()
 
-    plt.tight_layout()
-    plt.suptitle(f"{experiment_name.capitalize()} Experiment Results", fontsize=14, y=1.02)
-    plt.subplots_adjust(top=0.92)
+    fig.tight_layout()
+    fig.suptitle(f"{experiment_name.capitalize()} Experiment Results", fontsize=14, y=1.02)
+    fig.subplots_adjust(top=0.92)
 
     # Save figure
     out_path = os.path.join(base_dir, f"{experiment_name}_summary.png")
-    plt.savefig(out_path, dpi=300)
+    fig.savefig(out_path, dpi=300)
     print(f"[INFO] Saved plot to {out_path}")
-    plt.close()
+    if owns_fig:
+        plt.close(fig)
+
+def _process_one(args):
+    """Load one run's sender/receiver CSVs and summarize them (worker process)."""
+    base_dir, experiment_name, value = args
+    sender_df = load_metrics(base_dir, SENDER_NAME, experiment_name, value)
+    receiver_df = load_metrics(base_dir, RECEIVER_NAME, experiment_name, value)
+    if sender_df is None or receiver_df is None:
+        return None
+
+    summary = compute_summary(sender_df, receiver_df)
+    if not summary:
+        return None
+    return {"variable": value, **summary}
+
+def build_summary(base_dir, experiment_name, subdirs):
+    values = [extract_variable_value(folder, experiment_name) for folder in subdirs]
+    jobs = [(base_dir, experiment_name, value) for value in values if value is not None]
+
+    # Runs are independent: parse and summarize them in parallel
+    if len(jobs) > 1:
+        with ProcessPoolExecutor() as ex:
+            results = list(ex.map(_process_one, jobs))
+    else:
+        results = [_process_one(job) for job in jobs]
+    rows = [row for row in results if row is not None]
+
+    if not rows:
+        print(f"[WARN] No valid data found for experiment '{experiment_name}'")
+        return None
+
+    return pd.DataFrame.from_records(rows, columns=SUMMARY_COLUMNS).sort_values("variable")
 
 # --------------------------------------------
 # Main
@@ -159,6 +262,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--EXP_NAME", type=str, required=True, help="Experiment name (loss/delay/jitter)")
     parser.add_argument("--BASE_DIR", type=str, required=True, help="Base directory of experiments")
+    parser.add_argument("--REBUILD", action="store_true", help="Ignore the cached summary and re-read all CSVs")
     args = parser.parse_args()
 
     experiment_name = args.EXP_NAME
@@ -172,45 +276,15 @@ def main():
 
     subdirs = sorted([d for d in os.listdir(experiment_dir) if os.path.isdir(os.path.join(experiment_dir, d))])
 
-    results = {
-        "variable": [],
-        "sender_reliable_latency": [],
-        "receiver_reliable_latency": [],
-        "sender_unreliable_latency": [],
-        "receiver_unreliable_latency": [],
-        "throughput": [],
-        "reliability": [],
-        "window": [],
-        "inverse_window": []
-    }
-
-    for folder in subdirs:
-        value = extract_variable_value(folder, experiment_name)
-        if value is None:
-            continue
-
-        sender_df = load_metrics(base_dir, SENDER_NAME, experiment_name, value)
-        receiver_df = load_metrics(base_dir, RECEIVER_NAME, experiment_name, value)
-        if sender_df is None or receiver_df is None:
-            continue
-
-        summary = compute_summary(sender_df, receiver_df)
-        if summary:
-            results["variable"].append(value)
-            results["sender_reliable_latency"].append(summary["sender_reliable_latency"])
-            results["receiver_reliable_latency"].append(summary["receiver_reliable_latency"])
-            results["sender_unreliable_latency"].append(summary["sender_unreliable_latency"])
-            results["receiver_unreliable_latency"].append(summary["receiver_unreliable_latency"])
-            results["throughput"].append(summary["throughput"])
-            results["reliability"].append(summary["reliability"])
-            results["window"].append(summary["window"])
-            results["inverse_window"].append(summary["inverse_window"])
-
-    if not results["variable"]:
-        print(f"[WARN] No valid data found for experiment '{experiment_name}'")
-        return
+    df_summary = None if args.REBUILD else load_cached_summary(base_dir, experiment_name, subdirs)
+    if df_summary is not None:
+        print(f"[INFO] Using cached summary {summary_cache_path(base_dir, experiment_name)}")
+    else:
+        df_summary = build_summary(base_dir, experiment_name, subdirs)
+        if df_summary is None:
+            return
+        save_summary_cache(df_summary, base_dir, experiment_name, subdirs)
 
-    df_summary = pd.DataFrame(results).sort_values("variable")
     print(f"\n=== {experiment_name.upper()} SUMMARY ===")
     print(df_summary)
 
@@ -1,16 +1,20 @@
 # plot_metrics.py
 from __future__ import annotations
 import argparse
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # figures are only saved to PNG; no GUI backend needed
 import matplotlib.pyplot as plt
 import os
+from hudp.metrics import read_metrics_csv
 
 def compute_metrics(sender_csv: str, receiver_csv: str):
     """
     Compute performance metrics from sender & receiver CSVs.
     """
-    df_send = pd.read_csv(sender_csv)
-    df_recv = pd.read_csv(receiver_csv)
+    df_send = read_metrics_csv(sender_csv)
+    df_recv = read_metrics_csv(receiver_csv)
 
     # Compute duration
     if not df_recv.empty:
@@ -21,48 +25,37 @@ def compute_metrics(sender_csv: str, receiver_csv: str):
     if duration_s <= 0:
         duration_s = 1.0
 
-    metrics = []
-
-    for ch in sorted(set(df_send["channel"]).union(set(df_recv["channel"]))):
-        sent_df = df_send[df_send["channel"] == ch]
-        recv_df = df_recv[df_recv["channel"] == ch]
-
-        # For reliable channel, use the actual sequence numbers from receiver logs
-        if ch == 0:  # Reliable channel
-            # Get unique sequences from receiver (they're the ground truth)
-            received_sequences = set(recv_df["sequence"])
-            
-            # For sender, count only sequences that are within the expected range
-            # Based on receiver data, we know sequences should be 0-6
-            max_received_seq = max(received_sequences) if received_sequences else 0
-            sent_df_filtered = sent_df[sent_df["sequence"] <= max_received_seq]
-            sent_unique_count = sent_df_filtered["sequence"].nunique()
-            
-            recv_unique_count = len(received_sequences)
-        else:
-            # For unreliable, use normal counting
-            sent_unique_count = sent_df["sequence"].nunique()
-            recv_unique_count = recv_df["sequence"].nunique()
-
-        pdr = (recv_unique_count / sent_unique_count * 100.0) if sent_unique_count > 0 else 0.0
-
-        avg_latency = recv_df["latency_ms"].mean() if recv_unique_count > 0 else 0.0
-        jitter = recv_df["latency_ms"].std() if recv_unique_count > 0 else 0.0
-
-        total_bytes = recv_df["bytes"].sum() if recv_unique_count > 0 else 0
-        throughput_kbps = (total_bytes * 8 / 1000) / duration_s
-
-        metrics.append({
-            "channel": ch,
-            "packets_sent": sent_unique_count,
-            "packets_received": recv_unique_count,
-            "packet_delivery_ratio_%": round(pdr, 2),
-            "avg_latency_ms": round(avg_latency, 2),
-            "jitter_ms": round(jitter, 2),
-            "throughput_kbps": round(throughput_kbps, 3),
-        })
-
-    return pd.DataFrame(metrics)
+    # The reliable channel only counts sends up to the highest sequence the
+    # receiver logged (later ones were still in flight at shutdown)
+    recv_rel_seq = df_recv.loc[df_recv["channel"] == 0, "sequence"]
+    max_received_seq = recv_rel_seq.max() if len(recv_rel_seq) else 0
+    counted = (df_send["channel"] != 0) | (df_send["sequence"] <= max_received_seq)
+
+    # One groupby per frame yields every per-channel statistic
+    send_agg = df_send[counted].groupby("channel")["sequence"].nunique().rename("packets_sent")
+    recv_agg = df_recv.groupby("channel").agg(
+        packets_received=("sequence", "nunique"),
+        avg_latency_ms=("latency_ms", "mean"),
+        jitter_ms=("latency_ms", "std"),
+        total_bytes=("bytes", "sum"),
+    )
+    channels = df_send["channel"].unique().tolist() + df_recv["channel"].unique().tolist()
+    out = recv_agg.join(send_agg, how="outer").reindex(sorted(set(channels))).fillna(0)
+
+    sent = out["packets_sent"].astype(int)
+    received = out["packets_received"].astype(int)
+    pdr = np.where(sent > 0, received / sent.where(sent > 0, 1) * 100.0, 0.0)
+    throughput_kbps = (out["total_bytes"] * 8 / 1000) / duration_s
+
+    return pd.DataFrame({
+        "channel": out.index.to_numpy(),
+        "packets_sent": sent.to_numpy(),
+        "packets_received": received.to_numpy(),
+        "packet_delivery_ratio_%": np.round(pdr, 2),
+        "avg_latency_ms": out["avg_latency_ms"].round(2).to_numpy(),
+        "jitter_ms": out["jitter_ms"].round(2).to_numpy(),
+        "throughput_kbps": throughput_kbps.round(3).to_numpy(),
+    })
 
 
 def plot_all_metrics(df: pd.DataFrame, out_path: str):
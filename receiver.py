@@ -4,9 +4,8 @@ import argparse
 import signal
 import sys
 import time
-from hudp.packet import RELIABLE, UNRELIABLE, now_ms
+from hudp.packet import RELIABLE, UNRELIABLE, HEADER_SIZE, now_ms
 from hudp.game_net_api import GameNetAPI
-from hudp.packet import RELIABLE, now_ms
 from hudp.metrics import MetricsRecorder
 
 
@@ -17,20 +16,23 @@ def main():
     parser.add_argument("--port", type=int, required=True, help="Listen UDP port")
     parser.add_argument("--metrics", default="metrics_receiver.csv", help="Output CSV for metrics")
     parser.add_argument("--t_skip", type=int, default=200, help="Skip threshold t (ms) for reliable holes")
+    parser.add_argument("--bind_core", type=int, default=None, help="Pin the receive thread to this CPU (Linux)")
+    parser.add_argument("--quiet", action="store_true", help="Do not print every received packet")
     args = parser.parse_args()
 
     # Register signal handlers for clean shutdown
 
 
     mr = MetricsRecorder(role="receiver")
-    api = GameNetAPI(bind_addr=(args.bind, args.port), skip_threshold_ms=args.t_skip)
+    api = GameNetAPI(bind_addr=(args.bind, args.port), skip_threshold_ms=args.t_skip,
+                     bind_core=args.bind_core)
     api.start()
     print(f"Receiver listening on {args.bind}:{args.port}")
 
     def handle_signal(signum, frame):
         print(f"\nReceived signal {signum}, shutting down receiver and saving metrics...")
         api.stop()
-        mr.export_csv(args.metrics)
+        mr.export(args.metrics)
         summary = mr.get_summary()
         print("\n--- Receiver Summary ---")
         for ch in [RELIABLE, UNRELIABLE]:
@@ -40,6 +42,7 @@ def main():
                 print(f"  Channel {ch} ({ch_name}):")
                 print(f"    Packets Received: {stats['packets_received']}")
                 print(f"    Average Latency: {stats['avg_latency_ms']} ms")
+                print(f"    Latency p50/p95/p99: {stats['latency_p50_ms']}/{stats['latency_p95_ms']}/{stats['latency_p99_ms']} ms")
                 print(f"    Jitter: {stats['jitter_ms']} ms")
                 print(f"    Throughput: {stats['throughput_kbps']} kbps")
 
@@ -51,19 +54,20 @@ def main():
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
     
+    on_recv = mr.on_recv
+    verbose = not args.quiet
     while True:
-        channel, seq_num, ts, payload = api.recv(block=True)
-        
-        # Calculate actual bytes including header (7 bytes)
-        total_bytes = len(payload) + 7
-        mr.on_recv(channel, seq_num, total_bytes, ts)  # Pass sequence and actual bytes
-        
-        ch_type = "RELIABLE" if channel == RELIABLE else "UNRELIABLE"
-        latency = now_ms() - ts
-        if ch_type == "UNRELIABLE":
-            print(f"({ch_type}) Seq: {seq_num}, Latency: {latency}ms, Payload: {payload.decode('utf-8')}")
-        elif ch_type == "RELIABLE":
-            print(f"( {ch_type} ) Seq: {seq_num}, Latency: {latency}ms, Payload: {payload.decode('utf-8')}")
+        # Everything already queued is handled per wakeup
+        for channel, seq_num, ts, payload in api.recv_batch():
+            # Calculate actual bytes including header
+            on_recv(channel, seq_num, len(payload) + HEADER_SIZE, ts)
+
+            if verbose:
+                latency = now_ms() - ts
+                if channel == UNRELIABLE:
+                    print(f"(UNRELIABLE) Seq: {seq_num}, Latency: {latency}ms, Payload: {payload.decode('utf-8')}")
+                elif channel == RELIABLE:
+                    print(f"( RELIABLE ) Seq: {seq_num}, Latency: {latency}ms, Payload: {payload.decode('utf-8')}")
 
 if __name__ == "__main__":
     main()
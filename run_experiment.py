@@ -1,3 +1,4 @@
+import argparse
 import time
 import threading
 import numpy as np
@@ -16,16 +17,24 @@ def run_experiment(loss_rate, duration_sec=30, packet_rate=50):
     num_packets = duration_sec * packet_rate
     packet_interval = 1.0 / packet_rate
 
+    # Reliable/unreliable mix and payloads are built before the timed loop
+    rel_mask = (np.random.random(num_packets) > 0.5).tolist()
+    payloads = [(f"R_{i}" if rel else f"U_{i}").encode() for i, rel in enumerate(rel_mask)]
+
     def sender_task():
-        for i in range(num_packets):
-            # Send a mix of reliable and unreliable packets
-            is_reliable = random.random() > 0.5
-            payload = f"R_{i}".encode() if is_reliable else f"U_{i}".encode()
-            
-            # This loop ensures we send at the correct rate even if the window is full
-            while harness.sender_api.send(payload, is_reliable) is None:
-                time.sleep(0.001)
-            time.sleep(packet_interval)
+        send = harness.sender_api.send
+        # Absolute send schedule: sleep only while ahead of it, so sleep
+        # overshoot and time spent in send() do not accumulate as drift
+        deadline = time.perf_counter()
+        for payload, is_reliable in zip(payloads, rel_mask):
+            # A full reliable window makes send() block (up to its own timeout)
+            # and return None; just retry, no extra sleep needed
+            while send(payload, is_reliable) is None:
+                pass
+            deadline += packet_interval
+            slack = deadline - time.perf_counter()
+            if slack > 0:
+                time.sleep(slack)
 
     sender_thread = threading.Thread(target=sender_task)
     sender_thread.start()
@@ -38,15 +47,22 @@ def run_experiment(loss_rate, duration_sec=30, packet_rate=50):
     harness.cleanup()
     return harness
 
-def generate_report(harness: GameNetAPITestHarness, condition_name: str):
-    """Calculates metrics and generates plots for a single experiment."""
+def generate_report(harness: GameNetAPITestHarness, condition_name: str, fig=None, axes=None, show=False):
+    """Calculates metrics and generates plots for a single experiment.
+
+    Pass (fig, axes) from plt.subplots(1, 2) to reuse one figure across
+    reports; otherwise a new one is created.
+    """
     stats = harness.get_stats()
     
     # --- Calculate Final Metrics ---
     reliable_pdr = (stats['reliable_delivered'] / stats['reliable_sent'] * 100) if stats['reliable_sent'] > 0 else 0
     
-    latency_avg = np.mean(harness.latency_samples) if harness.latency_samples else 0
-    jitter_avg = np.mean(harness.jitter_samples) if harness.jitter_samples else 0
+    # Convert the harness's sample lists once; everything below uses the arrays
+    latency = np.asarray(harness.latency_samples, dtype=np.float64)
+    jitter = np.asarray(harness.jitter_samples, dtype=np.float64)
+    latency_avg = latency.mean() if latency.size else 0
+    jitter_avg = jitter.mean() if jitter.size else 0
     
     print("\n--- Results for: " + condition_name + " ---")
     print(f"Reliable PDR:         {reliable_pdr:.2f}%")
@@ -55,32 +71,44 @@ def generate_report(harness: GameNetAPITestHarness, condition_name: str):
     print(f"Total Retransmissions: {stats['retransmissions']}")
     
     # --- Generate Plots ---
-    plt.figure(figsize=(12, 5))
+    if fig is None:
+        fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    ax1, ax2 = axes
+    ax1.cla()
+    ax2.cla()
     
-    plt.subplot(1, 2, 1)
-    plt.hist(harness.latency_samples, bins=50, color='skyblue', edgecolor='black')
-    plt.title(f'Latency Distribution ({condition_name})')
-    plt.xlabel('One-way Latency (ms)')
-    plt.ylabel('Packet Count')
-    plt.axvline(latency_avg, color='r', linestyle='dashed', linewidth=1, label=f'Avg: {latency_avg:.2f}ms')
-    plt.legend()
+    bins = np.linspace(latency.min(), latency.max(), 51) if latency.size else 50
+    ax1.hist(latency, bins=bins, color='skyblue', edgecolor='black')
+    ax1.set_title(f'Latency Distribution ({condition_name})')
+    ax1.set_xlabel('One-way Latency (ms)')
+    ax1.set_ylabel('Packet Count')
+    ax1.axvline(latency_avg, color='r', linestyle='dashed', linewidth=1, label=f'Avg: {latency_avg:.2f}ms')
+    ax1.legend()
     
-    plt.subplot(1, 2, 2)
-    plt.plot(harness.jitter_samples, alpha=0.7)
-    plt.title(f'Jitter Over Time ({condition_name})')
-    plt.xlabel('Received Packet Sequence')
-    plt.ylabel('Jitter (ms)')
+    ax2.plot(jitter, alpha=0.7)
+    ax2.set_title(f'Jitter Over Time ({condition_name})')
+    ax2.set_xlabel('Received Packet Sequence')
+    ax2.set_ylabel('Jitter (ms)')
     
-    plt.tight_layout()
-    plt.savefig(f"report_{condition_name.replace(' ', '_')}.png")
-    plt.show()
+    fig.tight_layout()
+    fig.savefig(f"report_{condition_name.replace(' ', '_')}.png")
+    if show:
+        plt.show()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the low/high loss experiments and plot reports")
+    parser.add_argument("--show", action="store_true", help="Open each report window after saving it")
+    args = parser.parse_args()
+
     # Run two experiments as required by the specification
     low_loss_harness = run_experiment(loss_rate=0.02) # 2% loss
     high_loss_harness = run_experiment(loss_rate=0.10) # 10% loss
 
+    # Headless runs draw both reports into one figure; a shown window is
+    # closed by the user, so --show gets a fresh figure per report
+    fig, axes = (None, None) if args.show else plt.subplots(1, 2, figsize=(12, 5))
+
     # Generate the output for each
-    generate_report(low_loss_harness, "Low Loss Condition (2%)")
-    generate_report(high_loss_harness, "High Loss Condition (10%)")
\ No newline at end of file
+    generate_report(low_loss_harness, "Low Loss Condition (2%)", fig, axes, args.show)
+    generate_report(high_loss_harness, "High Loss Condition (10%)", fig, axes, args.show)
@@ -4,13 +4,33 @@ from __future__ import annotations
 import argparse
 import time
 import os
-import random
+import numpy as np
 
 from hudp.game_net_api import GameNetAPI
 from hudp.packet import RELIABLE, UNRELIABLE, now_ms
 from hudp.emulator import UDPEngineEmulator
 from hudp.metrics import MetricsRecorder
 
+# Sleep ends this long before a deadline and the rest is spun, since
+# time.sleep() can overshoot by a scheduler tick
+SPIN_S = 0.0005
+# Most packets sent back-to-back to catch up after falling behind schedule
+MAX_CATCHUP = 10
+# Payload template; bytes %-formatting skips the str + encode round trip
+PAYLOAD_FMT = b"packet_%d"
+# Fraction of packets sent on the reliable channel
+RELIABLE_SHARE = 0.2
+
+
+def precise_sleep_until(deadline: float) -> None:
+    """Wait until time.perf_counter() reaches deadline."""
+    remaining = deadline - time.perf_counter()
+    if remaining > SPIN_S:
+        time.sleep(remaining - SPIN_S)
+    while time.perf_counter() < deadline:
+        pass
+
+
 def main():
     parser = argparse.ArgumentParser(description="H-UDP Sender (stub)")
     parser.add_argument("--server", required=True, help="Receiver IP or hostname")
@@ -21,10 +41,12 @@ def main():
     parser.add_argument("--delay", type=int, default=0, help="Sender-side emulator base delay ms")
     parser.add_argument("--jitter", type=int, default=0, help="Sender-side emulator jitter ms")
     parser.add_argument("--metrics", default="metrics_sender.csv", help="Output CSV for metrics")
+    parser.add_argument("--gso", action="store_true",
+                        help="Coalesce equal-size datagrams with UDP GSO (Linux; ignored with the emulator)")
     args = parser.parse_args()
 
     mr = MetricsRecorder(role="sender")
-    api = GameNetAPI(metrics=mr)
+    api = GameNetAPI(metrics=mr, gso=args.gso)
     api.set_peer((args.server, args.port))
 
     if args.loss > 0 or args.delay > 0 or args.jitter > 0:
@@ -39,38 +61,62 @@ def main():
     api.start()
     print(f"Sending {args.pps} packets/sec for {args.duration} seconds to {args.server}:{args.port}")
 
-    start_time = time.time()
+    interval = 1.0 / args.pps
+    start_time = time.perf_counter()
+    end_time = start_time + args.duration
+    # Absolute schedule: packet n is due at start + n*interval, so sleep
+    # overshoot never accumulates; when behind, packets go out back-to-back
+    next_deadline = start_time
     packet_count = 0
+    # Channel mix drawn up front: a shuffled run with exactly RELIABLE_SHARE
+    # reliable slots, indexed by packet number (wraps if the run overshoots)
+    n_slots = max(1, int(args.pps * args.duration))
+    mix = np.zeros(n_slots, dtype=bool)
+    mix[:round(RELIABLE_SHARE * n_slots)] = True
+    np.random.default_rng().shuffle(mix)
+    mix = mix.tolist()
     try:
-        while time.time() - start_time < args.duration:
+        while True:
+            now = time.perf_counter()
+            if now >= end_time:
+                break
+            if next_deadline > now:
+                precise_sleep_until(next_deadline)
+                due = 1
+            else:
+                # Behind schedule: every overdue packet goes out in one batch
+                due = int((now - next_deadline) / interval) + 1
+                if due > MAX_CATCHUP:
+                    # Too far behind (e.g. after a stall): drop the excess backlog
+                    due = MAX_CATCHUP
+                    next_deadline = now - (MAX_CATCHUP - 1) * interval
+
             # Check if peer has signaled shutdown (zero window)
             if api.is_peer_shutdown():
                 print("\nPeer has shut down (received zero-window signal). Stopping sender.")
                 break
 
-            is_reliable = random.random() < 0.2
-            channel = RELIABLE if is_reliable else UNRELIABLE
+            flags = [mix[(packet_count + i) % n_slots] for i in range(due)]
+            payloads = [PAYLOAD_FMT % (packet_count + i) for i in range(due)]
 
-            payload = f"packet_{packet_count}".encode('utf-8')
+            # Send and get sequence numbers
+            seqs = api.send_many(payloads, flags)
 
-            # Send and get sequence number
-            seq_num = api.send(payload, reliable=is_reliable)
-            
-            if seq_num is None:
-                # Window is full, check if peer shut down
-                if api.is_peer_shutdown():
-                    print("\nPeer has shut down while window was full. Stopping sender.")
-                    break
-                # Otherwise just skip this packet and continue
-                time.sleep(0.01)
-                continue
+            # Record the burst in one call: (channel, sequence, bytes incl. 7-byte header)
+            rows = [(RELIABLE if is_reliable else UNRELIABLE, seq_num, len(payload) + 7)
+                    for payload, is_reliable, seq_num in zip(payloads, flags, seqs)
+                    if seq_num is not None]
+            mr.on_sent_many(rows)
+            sent = len(rows)
 
-            # Calculate actual bytes including header (7 bytes)
-            total_bytes = len(payload) + 7
-            mr.on_sent(channel, seq_num, total_bytes)  # Pass sequence and actual bytes
+            packet_count += sent
+            next_deadline += sent * interval
 
-            packet_count += 1
-            time.sleep(1.0 / args.pps)
+            # A refused send already blocked on the SR window condition until
+            # its timeout, so retry the refused slots next round without sleeping
+            if sent < due and api.is_peer_shutdown():
+                print("\nPeer has shut down while window was full. Stopping sender.")
+                break
 
     except KeyboardInterrupt:
         print("\nSender shutting down.")
@@ -78,28 +124,16 @@ def main():
         print("Stopping API and generating report...")
         api.stop()
 
-        mr.export_csv(args.metrics)
-
-        # Read the CSV to count unique sequences (like plot_metrics does)
-        import pandas as pd
-        try:
-            df_send = pd.read_csv(args.metrics)
-            
-            # Count unique sequences per channel
-            reliable_sent = df_send[df_send['channel'] == 0]['sequence'].nunique()
-            unreliable_sent = df_send[df_send['channel'] == 1]['sequence'].nunique()
-            
-            # Get ACK count from metrics
-            summary = mr.get_summary()
-            reliable_acked = summary[0]['packets_received'] if 0 in summary else 0
-            
-        except Exception as e:
-            print(f"Error analyzing metrics: {e}")
-            # Fallback to old method
-            summary = mr.get_summary()
-            reliable_sent = summary[0]['packets_sent'] if 0 in summary else 0
-            unreliable_sent = summary[1]['packets_sent'] if 1 in summary else 0
-            reliable_acked = summary[0]['packets_received'] if 0 in summary else 0
+        mr.export(args.metrics)
+
+        # Count unique sequences per channel straight from the recorder
+        unique_sent = mr.unique_sent_counts()
+        reliable_sent = unique_sent.get(RELIABLE, 0)
+        unreliable_sent = unique_sent.get(UNRELIABLE, 0)
+
+        # Get ACK count from metrics
+        summary = mr.get_summary()
+        reliable_acked = summary[0]['packets_received'] if 0 in summary else 0
 
         print("\n--- Sender Summary ---")
         print(f"  Channel 0 (Reliable):")